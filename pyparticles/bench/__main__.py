@@ -0,0 +1,52 @@
+"""Run the benchmark scenarios headlessly and print the results as JSON.
+
+Usage:
+    python -m pyparticles.bench [scenario ...] [--engine object|palette|sparse|headless|array]
+        [--seed N] [--output results.json] [--baseline baseline.json] [--tolerance 0.1]
+        [--no-memory]
+
+Exits with status 1 if any metric regressed compared to the baseline.
+"""
+import os
+# the benchmarks never open a window, so use the dummy video driver before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import sys
+from pyparticles.bench import runner
+from pyparticles.bench.scenarios import SCENARIOS
+
+def main(argv=None):
+    names = [s.name for s in SCENARIOS]
+    parser = argparse.ArgumentParser(prog='python -m pyparticles.bench')
+    parser.add_argument('scenarios', nargs='*',
+        help=f'scenarios to run, defaults to all of them ({", ".join(names)})')
+    parser.add_argument('--engine',
+        choices=['object', 'palette', 'sparse', 'headless', 'array'], default='object')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the results to')
+    parser.add_argument('--baseline', help='results file to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+        help='fraction a metric can get worse by before it counts as a regression')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    args = parser.parse_args(argv)
+    for name in args.scenarios:
+        if name not in names:
+            parser.error(f'unknown scenario {name}')
+
+    scenario_types = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    results = runner.run_all(scenario_types, args.engine, args.seed, not args.no_memory)
+    print(json.dumps(results, indent=4))
+    if args.output is not None:
+        runner.save_results(results, args.output)
+    if args.baseline is None:
+        return 0
+    regressions = runner.compare(results, runner.load_results(args.baseline), args.tolerance)
+    for r in regressions:
+        print(f'Regression: {r}', file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import gc
+import json
+import time
+import tracemalloc
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects.particles import TestParticle
+
+# pixel size of each grid cell in benchmark simulations
+CELL_SIZE = (4, 4)
+
+# metrics checked by `compare()`, and whether a higher value is better for each of them
+CHECKED_METRICS = {
+    'steps_per_sec': True,
+    'draw_ms': False,
+    'peak_memory': False,
+}
+
+# grid size of the simulation filled by `measure_particle_memory()`
+PARTICLE_MEMORY_SIZE = (200, 100)
+
+def make_sim(engine, sim_size, seed):
+    """Create an empty simulation for a benchmark.
+
+    Args:
+        engine (str): Which engine to use: `'object'` for `ParticleSim`, `'palette'` for
+            `ParticleSim` drawing without sprites, `'sparse'` for a sparse `ParticleSim`,
+            `'headless'` for a `ParticleSim` that isn't drawn, or `'array'` for `ArraySim`.
+        sim_size (tuple): Grid size of the simulation.
+        seed (int): Seed for the simulation's random draws.
+
+    Returns:
+        ParticleSim: The new simulation.
+    """
+    if engine == 'array':
+        from pyparticles.engine.arraysim import ArraySim
+        return ArraySim(sim_size, CELL_SIZE, bg_clr='black', seed=seed)
+    if engine == 'object':
+        return ParticleSim(sim_size, CELL_SIZE, bg_clr='black', seed=seed)
+    if engine == 'palette':
+        return ParticleSim(sim_size, CELL_SIZE, bg_clr='black', seed=seed, render='palette')
+    if engine == 'sparse':
+        return ParticleSim(sim_size, CELL_SIZE, bg_clr='black', seed=seed, sparse=True)
+    if engine == 'headless':
+        return ParticleSim(sim_size, CELL_SIZE, seed=seed, render=None)
+    raise ValueError('Expected engine to be \'object\', \'palette\', \'sparse\', \'headless\', '
+        f'or \'array\', but got {engine}')
+
+def _run(scenario_type, engine, seed):
+    """Run a scenario once, measuring step and draw times.
+
+    Returns:
+        dict: The raw measurements of the run.
+    """
+    scenario = scenario_type(seed)
+    sim = make_sim(engine, scenario.sim_size, seed)
+    scenario.setup(sim)
+    for i in range(scenario.warmup):
+        scenario.before_step(sim, i)
+        sim.update()
+        sim.pop_dirty_rects()
+    step_time = 0.0
+    draw_time = 0.0
+    updates = 0
+    for i in range(scenario.warmup, scenario.warmup + scenario.steps):
+        scenario.before_step(sim, i)
+        start = time.perf_counter()
+        updates += sim.step()
+        mid = time.perf_counter()
+        sim.draw()
+        end = time.perf_counter()
+        sim.pop_dirty_rects()
+        step_time += mid - start
+        draw_time += end - mid
+    return {
+        'steps': scenario.steps,
+        'step_time': step_time,
+        'draw_time': draw_time,
+        'updates': updates,
+    }
+
+def run_scenario(scenario_type, engine='object', seed=0, memory=True):
+    """Run a benchmark scenario and summarize its performance.
+
+    Peak memory is measured with `tracemalloc` in a second run of the scenario, since tracing
+    allocations slows down everything else. It only counts memory allocated through Python, so
+    pixel data owned by pygame surfaces isn't included.
+
+    Args:
+        scenario_type (type): The `Scenario` subclass to run.
+        engine (str): Which engine to run the scenario on. Defaults to `'object'`.
+        seed (int): Seed for the scenario and simulation. Defaults to 0.
+        memory (bool): Whether or not to measure peak memory. Defaults to True.
+
+    Returns:
+        dict: Steps per second, particle updates per second, mean draw time per step in
+            milliseconds, and peak memory in bytes (or None if not measured).
+    """
+    gc.collect()
+    run = _run(scenario_type, engine, seed)
+    peak_memory = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        _run(scenario_type, engine, seed)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'steps_per_sec': run['steps'] / run['step_time'] if run['step_time'] > 0 else None,
+        'updates_per_sec': run['updates'] / run['step_time'] if run['step_time'] > 0 else None,
+        'draw_ms': 1000 * run['draw_time'] / run['steps'],
+        'peak_memory': peak_memory,
+    }
+
+def measure_particle_memory(engine='object', seed=0, particle_type=TestParticle):
+    """Measure how much memory each particle in a simulation takes up.
+
+    An empty simulation is completely filled with particles, and the memory allocated while
+    filling it is divided by the number of particles added. Like `run_scenario()`, this only
+    counts memory allocated through Python.
+
+    Args:
+        engine (str): Which engine to measure. Defaults to `'object'`.
+        seed (int): Seed for the simulation. Defaults to 0.
+        particle_type (type): The particle class to fill the simulation with. Defaults to
+            `TestParticle`.
+
+    Returns:
+        float: Bytes allocated per particle.
+    """
+    sim = make_sim(engine, PARTICLE_MEMORY_SIZE, seed)
+    w, h = PARTICLE_MEMORY_SIZE
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for x in range(w):
+        for y in range(h):
+            sim.add_particle(particle_type(), (x, y))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / (w * h)
+
+def run_all(scenario_types, engine='object', seed=0, memory=True):
+    """Run several benchmark scenarios.
+
+    Args:
+        scenario_types (list[type]): The `Scenario` subclasses to run.
+        engine (str): Which engine to run the scenarios on. Defaults to `'object'`.
+        seed (int): Seed for the scenarios and simulations. Defaults to 0.
+        memory (bool): Whether or not to measure peak memory. Defaults to True.
+
+    Returns:
+        dict: The engine, seed, bytes per particle (or None if memory isn't measured), and
+            results of each scenario, keyed by scenario name.
+    """
+    results = {}
+    for scenario_type in scenario_types:
+        results[scenario_type.name] = run_scenario(scenario_type, engine, seed, memory)
+    bytes_per_particle = measure_particle_memory(engine, seed) if memory else None
+    return {
+        'engine': engine,
+        'seed': seed,
+        'bytes_per_particle': bytes_per_particle,
+        'scenarios': results,
+    }
+
+def compare(results, baseline, tolerance=0.1):
+    """Compare benchmark results against a baseline to find regressions.
+
+    Only scenarios and metrics present in both the results and the baseline are compared.
+    Bytes per particle is compared as well, if both have it.
+
+    Args:
+        results (dict): Results from `run_all()`.
+        baseline (dict): Earlier results from `run_all()` to compare against.
+        tolerance (float): Fraction a metric can get worse by before it counts as a regression.
+            Defaults to 0.1.
+
+    Returns:
+        list[str]: A description of each regression found.
+    """
+    regressions = []
+    new = results.get('bytes_per_particle')
+    old = baseline.get('bytes_per_particle')
+    if new is not None and old is not None and new > old * (1 + tolerance):
+        regressions.append(f'bytes_per_particle rose from {old:.4g} to {new:.4g}')
+    for name, metrics in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in CHECKED_METRICS.items():
+            new = metrics.get(metric)
+            old = base.get(metric)
+            if new is None or old is None:
+                continue
+            if higher_is_better and new < old * (1 - tolerance):
+                regressions.append(f'{name}: {metric} dropped from {old:.4g} to {new:.4g}')
+            if not higher_is_better and new > old * (1 + tolerance):
+                regressions.append(f'{name}: {metric} rose from {old:.4g} to {new:.4g}')
+    return regressions
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
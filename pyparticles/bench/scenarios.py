@@ -0,0 +1,135 @@
+import random
+from pyparticles.objects.particles import TestLiquidParticle, TestParticle
+
+class Scenario():
+    """Base class for benchmark scenarios.
+
+    A scenario fills a fresh simulation in `setup()`, then the simulation is stepped `warmup`
+    times without being measured, followed by `steps` measured steps. `before_step()` is called
+    before every step (warm-up steps included) so scenarios can keep editing the world as it runs.
+
+    Any random choices made by a scenario must use `rng` so every run of a scenario with the same
+    seed is identical.
+
+    Args:
+        seed (int): Seed for the scenario's own random choices. Defaults to 0.
+
+    Attributes:
+        name (str): Name the scenario is reported under.
+        sim_size (tuple): Grid size of the simulation to run the scenario in.
+        warmup (int): Number of unmeasured steps to run before measuring.
+        steps (int): Number of measured steps.
+        rng (random.Random): Random number generator for the scenario's own choices.
+    """
+
+    name = None
+    sim_size = (120, 120)
+    warmup = 0
+    steps = 300
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def setup(self, sim):
+        """Fill the simulation before any steps are run.
+
+        Args:
+            sim (ParticleSim): The simulation to fill.
+        """
+
+    def before_step(self, sim, step):
+        """Edit the simulation before a step is run.
+
+        Args:
+            sim (ParticleSim): The simulation being run.
+            step (int): Index of the step about to be run, counting warm-up steps.
+        """
+
+def fill_rect(sim, rng, left, top, width, height, particle_type=TestParticle):
+    """Fill a rectangle of the simulation with new particles.
+
+    Args:
+        sim (ParticleSim): The simulation to fill.
+        rng (random.Random): Generator used to pick the particles' sprites.
+        left (int): Left edge of the rectangle, in grid cells.
+        top (int): Top edge of the rectangle, in grid cells.
+        width (int): Width of the rectangle, in grid cells.
+        height (int): Height of the rectangle, in grid cells.
+        particle_type (type): Class of the particles to fill it with. Defaults to TestParticle.
+    """
+    for x in range(left, left + width):
+        for y in range(top, top + height):
+            sim.add_particle(particle_type(rng=rng), (x, y))
+
+class ColumnCollapse(Scenario):
+    """A tall column of particles dropped into an empty world, collapsing into a pile."""
+
+    name = 'column_collapse'
+
+    def setup(self, sim):
+        fill_rect(sim, self.rng, 50, 0, 20, 100)
+
+class BrushPile(Scenario):
+    """A round brush painting particles at the same spot, the same way `main.paint()` does."""
+
+    name = 'brush_pile'
+    brush_pos = (60, 10)
+    brush_size = 3
+    brush_steps = 150
+
+    def before_step(self, sim, step):
+        if step >= self.brush_steps:
+            return
+        bx, by = self.brush_pos
+        for x in range(-self.brush_size, self.brush_size + 1):
+            for y in range(-self.brush_size, self.brush_size + 1):
+                if x**2 + y**2 <= self.brush_size**2:
+                    sim.add_particle(TestParticle(rng=self.rng), (bx + x, by + y))
+
+class SettledWorld(Scenario):
+    """A large world that has fully settled before measuring starts, so nothing should move."""
+
+    name = 'settled'
+    sim_size = (200, 150)
+    warmup = 300
+
+    def setup(self, sim):
+        fill_rect(sim, self.rng, 0, 110, 200, 40)
+        fill_rect(sim, self.rng, 80, 90, 40, 20)
+
+class RemovalChurn(Scenario):
+    """A settled world where particles are constantly removed from the pile and dropped back in.
+
+    Attributes:
+        depth (int): Number of rows filled with particles at the bottom of the world.
+        churn (int): Number of particles removed and added on every measured step.
+    """
+
+    name = 'removal_churn'
+    sim_size = (100, 80)
+    warmup = 200
+    depth = 30
+    churn = 4
+
+    def setup(self, sim):
+        w, h = self.sim_size
+        fill_rect(sim, self.rng, 0, h - self.depth, w, self.depth)
+
+    def before_step(self, sim, step):
+        if step < self.warmup:
+            return
+        w, h = self.sim_size
+        for _ in range(self.churn):
+            sim.remove_particle((self.rng.randrange(w), self.rng.randrange(h - self.depth, h)))
+            pos = (self.rng.randrange(w), self.rng.randrange(10))
+            sim.add_particle(sim.new_particle(TestParticle, rng=self.rng), pos)
+
+class DamBreak(Scenario):
+    """A block of liquid released at one side of the world, flowing out until it's level."""
+
+    name = 'dam_break'
+
+    def setup(self, sim):
+        fill_rect(sim, self.rng, 0, 40, 30, 80, TestLiquidParticle)
+
+SCENARIOS = [ColumnCollapse, BrushPile, SettledWorld, RemovalChurn, DamBreak]
@@ -0,0 +1,707 @@
+import time
+import numpy as np
+from pyparticles.engine.regions import region_cells
+from pyparticles.engine.simulation import BaseSim
+from pyparticles.engine.utils import as_xy, lazy_import
+
+# only imported once something is drawn, so headless simulations and worker processes don't need it
+pygame = lazy_import('pygame')
+
+# species id used for empty cells
+_EMPTY = 0
+# color used for empty cells when drawing, which is then keyed out to show the background
+_COLOR_KEY = (255, 0, 255)
+
+def _span(size, offset):
+    """Get the slices that line up an axis of `size` cells with itself shifted by `offset`.
+
+    Args:
+        size (int): Length of the axis.
+        offset (int): Number of cells to shift by.
+
+    Returns:
+        tuple[slice, slice]: The destination slice and the source slice, in that order.
+    """
+    dest = slice(max(0, -offset), min(size, size - offset))
+    src = slice(max(0, offset), min(size, size + offset))
+    return dest, src
+
+def _shifted(arr, dx, dy, fill):
+    """Shift a grid so each cell holds the value found at `(x+dx, y+dy)` in the original grid.
+
+    Args:
+        arr (numpy.ndarray): 2D grid indexed as `[y, x]`.
+        dx (int): X offset to read from.
+        dy (int): Y offset to read from.
+        fill (any): Value used for cells whose offset falls outside the grid.
+
+    Returns:
+        numpy.ndarray: The shifted grid.
+    """
+    out = np.full_like(arr, fill)
+    h, w = arr.shape
+    out_y, arr_y = _span(h, dy)
+    out_x, arr_x = _span(w, dx)
+    out[out_y, out_x] = arr[arr_y, arr_x]
+    return out
+
+def _dilate(mask, radius):
+    """Grow every set cell of a mask into a square of the given radius.
+
+    Args:
+        mask (numpy.ndarray): 2D boolean grid.
+        radius (int): Number of cells to grow by in each direction.
+
+    Returns:
+        numpy.ndarray: The dilated mask.
+    """
+    out = mask.copy()
+    for d in range(1, radius + 1):
+        out[d:, :] |= mask[:-d, :]
+        out[:-d, :] |= mask[d:, :]
+    rows = out.copy()
+    for d in range(1, radius + 1):
+        out[:, d:] |= rows[:, :-d]
+        out[:, :-d] |= rows[:, d:]
+    return out
+
+class _Rules():
+    """Movement rules of a species.
+
+    Kept separate from `_Species` so the rules can be sent to worker processes without also
+    sending the particle class and colors.
+
+    Attributes:
+        id (int): Species id the rules apply to.
+        gravity_vec (tuple): Gravity vector, or None if the species doesn't fall.
+        gravity_prob (float): Probability of falling when able to.
+        heap_vecs (list[tuple]): Directions the species can move to form heaps.
+        heap_limits (list[tuple]): Vectors that force the species to slide if they're empty.
+        heap_prob (float): Probability of forming a heap when able to.
+    """
+
+    def __init__(self, species_id, gravity_vec=None, gravity_prob=1.0, heap_vecs=None,
+        heap_prob=1.0, heap_limits=None):
+        self.id = species_id
+        self.gravity_vec = gravity_vec
+        self.gravity_prob = gravity_prob
+        self.heap_vecs = heap_vecs if heap_vecs is not None else []
+        self.heap_prob = heap_prob
+        self.heap_limits = heap_limits if heap_limits is not None else []
+
+    def vectors(self):
+        """Get every vector this species looks at when it updates.
+
+        Returns:
+            list[tuple]: The gravity, heap, and heap limit vectors of this species.
+        """
+        vecs = self.heap_vecs + self.heap_limits
+        if self.gravity_vec is not None:
+            vecs.append(self.gravity_vec)
+        return vecs
+
+class _Species():
+    """Behaviour parameters shared by every particle of a given type in an `ArraySim`.
+
+    The parameters are read from a single prototype instance of the particle type, so any
+    particle type built from the properties in `pyparticles.objects.properties` can be used.
+
+    Args:
+        species_id (int): Id used to store this species in the grid.
+        particle_type (type): The particle class this species represents.
+    """
+
+    def __init__(self, species_id, particle_type):
+        self.id = species_id
+        self.particle_type = particle_type
+        # colors are only looked up once the simulation's palette is built
+        self.colors = list(getattr(particle_type, 'colors', ['white']))
+        proto = particle_type()
+        self.rules = _Rules(species_id)
+        gravity = getattr(proto, 'gravity', None)
+        if gravity is not None and (gravity.vec.x != 0 or gravity.vec.y != 0):
+            self.rules.gravity_vec = tuple(gravity.vec)
+            self.rules.gravity_prob = gravity.prob
+        heap = getattr(proto, 'heap', None)
+        if heap is not None:
+            self.rules.heap_vecs = [tuple(v) for v in heap.vecs]
+            self.rules.heap_limits = [tuple(v) for v in heap.limits]
+            self.rules.heap_prob = heap.prob
+
+# names and types of the per-cell arrays an ArraySim is made of. Arrays with a leading 2 hold two
+# values per cell
+GRID_ARRAYS = {
+    'species': ((), np.uint16),
+    'variant': ((), np.uint8),
+    'active': ((), bool),
+    'stuck': ((), bool),
+    'new': ((), bool),
+    'moved': ((), bool),
+    'changed': ((), bool),
+    'updateable': ((), bool),
+    'rand': ((2,), np.float32),
+    'offsets': ((2,), np.uint16),
+}
+# random offsets are drawn from 0 to this, which is divisible by any vector count from 1 to 8
+_OFFSET_RANGE = 840
+
+class _Window():
+    """Views of a simulation's arrays covering a stripe of rows, plus a margin around it.
+
+    Only particles inside the stripe itself are updated, but they can look and move into the
+    margin. The margin is at least as tall as the farthest any vector reaches, so every cell a
+    particle in the stripe looks at is inside the window.
+
+    Args:
+        arrays (dict[str, numpy.ndarray]): The simulation's arrays, keyed by the names in
+            `GRID_ARRAYS`.
+        top (int): First row of the stripe.
+        bottom (int): Row after the last row of the stripe.
+        reach (int): Height of the margin above and below the stripe.
+    """
+
+    def __init__(self, arrays, top, bottom, reach):
+        height = arrays['species'].shape[0]
+        start = max(0, top - reach)
+        end = min(height, bottom + reach)
+        rows = slice(start, end)
+        self.species = arrays['species'][rows]
+        self.variant = arrays['variant'][rows]
+        self.active = arrays['active'][rows]
+        self.stuck = arrays['stuck'][rows]
+        self.new = arrays['new'][rows]
+        self.moved = arrays['moved'][rows]
+        self.changed = arrays['changed'][rows]
+        self.updateable = arrays['updateable'][rows]
+        self.rand = arrays['rand'][:, rows]
+        self.offsets = arrays['offsets'][:, rows]
+        self.source = np.zeros(self.species.shape, dtype=bool)
+        self.source[top - start:bottom - start] = True
+
+    def move(self, movers, dx, dy, unstick=False):
+        """Move every particle in a mask by the same vector.
+
+        The destination of every mover must be empty and inside the window.
+
+        Args:
+            movers (numpy.ndarray): Boolean grid of the particles to move.
+            dx (int): X distance to move.
+            dy (int): Y distance to move.
+            unstick (bool): Whether or not moved particles should be unstuck. Defaults to False.
+        """
+        src_y, src_x = np.nonzero(movers)
+        if len(src_y) == 0:
+            return
+        dst_y = src_y + dy
+        dst_x = src_x + dx
+        for arr in (self.species, self.variant, self.active, self.stuck):
+            arr[dst_y, dst_x] = arr[src_y, src_x]
+            arr[src_y, src_x] = 0
+        if unstick:
+            self.stuck[dst_y, dst_x] = False
+        self.moved[dst_y, dst_x] = True
+        self.changed[src_y, src_x] = True
+        self.changed[dst_y, dst_x] = True
+
+    def candidates(self, rules):
+        """Get the particles of a species that should be updated.
+
+        Args:
+            rules (_Rules): Rules of the species.
+
+        Returns:
+            numpy.ndarray: Boolean grid of the particles to update.
+        """
+        return (self.species == rules.id) & self.active & self.source & ~self.moved & ~self.new
+
+    @staticmethod
+    def select(cand, offsets, count, attempt, index):
+        """Get the cells that should try vector `index` on their `attempt`th try.
+
+        Each cell tries its vectors in a rotated order, starting from its own random offset.
+
+        Args:
+            cand (numpy.ndarray): Boolean grid of cells still trying to move.
+            offsets (numpy.ndarray): Random offset of each cell.
+            count (int): Number of vectors being tried.
+            attempt (int): Which try this is, starting from 0.
+            index (int): Index of the vector being tried.
+
+        Returns:
+            numpy.ndarray: Boolean grid of cells that should try the vector.
+        """
+        if count <= 1:
+            return cand
+        return cand & (((offsets + attempt) % count) == index)
+
+    def apply_gravity(self, rules):
+        dx, dy = rules.gravity_vec
+        src = self.candidates(rules)
+        occupied = self.species != _EMPTY
+        can_move = src & _shifted(~occupied, dx, dy, False)
+        movers = can_move & (self.rand[0] < rules.gravity_prob)
+        # particles that failed the random check or are blocked by an active particle stay active
+        self.updateable |= can_move & ~movers
+        self.updateable |= src & _shifted(occupied & self.active, dx, dy, False)
+        self.move(movers, dx, dy)
+
+    def apply_heap(self, rules):
+        cand = self.candidates(rules)
+        if rules.gravity_vec is not None:
+            # particles that can still fall aren't part of a heap yet
+            gx, gy = rules.gravity_vec
+            cand &= ~_shifted(self.species == _EMPTY, gx, gy, False)
+        in_bounds = np.ones(self.species.shape, dtype=bool)
+        # move towards any empty heap limits, or mark the particle as being at its limit
+        limit_triggered = np.zeros(self.species.shape, dtype=bool)
+        count = len(rules.heap_limits)
+        for attempt in range(count):
+            for i, (lx, ly) in enumerate(rules.heap_limits):
+                sel = self.select(cand, self.offsets[0], count, attempt, i)
+                occupied = self.species != _EMPTY
+                hit = sel & _shifted(~occupied, lx, ly, False)
+                nx, ny = int(np.sign(lx)), int(np.sign(ly))
+                near_empty = _shifted(~occupied, nx, ny, False)
+                movers = hit & near_empty
+                blocked = hit & ~near_empty & _shifted(in_bounds, nx, ny, False)
+                limit_triggered |= blocked
+                self.updateable |= blocked & _shifted(occupied & self.active, nx, ny, False)
+                cand &= ~movers
+                self.move(movers, nx, ny, unstick=True)
+        # try to form a heap with whatever particles aren't stuck or at their limit
+        cand &= ~limit_triggered & ~self.stuck
+        count = len(rules.heap_vecs)
+        for attempt in range(count):
+            for i, (hx, hy) in enumerate(rules.heap_vecs):
+                sel = self.select(cand, self.offsets[1], count, attempt, i)
+                occupied = self.species != _EMPTY
+                hit = sel & _shifted(~occupied, hx, hy, False)
+                movers = hit & (self.rand[1] < rules.heap_prob)
+                self.stuck |= hit & ~movers
+                if rules.heap_prob >= 1.0:
+                    self.updateable |= sel & _shifted(occupied & self.active, hx, hy, False)
+                cand &= ~hit
+                self.move(movers, hx, hy, unstick=True)
+
+def step_stripe(arrays, top, bottom, reach, rules_list):
+    """Update the particles in a stripe of rows by one step.
+
+    Gravity is applied to every species first, followed by heap movement. Stripes that are at
+    least `2 * reach` rows apart never touch the same cells, so they can be stepped at the same
+    time.
+
+    Args:
+        arrays (dict[str, numpy.ndarray]): The simulation's arrays, keyed by the names in
+            `GRID_ARRAYS`.
+        top (int): First row of the stripe.
+        bottom (int): Row after the last row of the stripe.
+        reach (int): Farthest distance any species' vectors reach.
+        rules_list (list[_Rules]): Rules of every species in the simulation.
+    """
+    window = _Window(arrays, top, bottom, reach)
+    for rules in rules_list:
+        if rules.gravity_vec is not None:
+            window.apply_gravity(rules)
+    for rules in rules_list:
+        if rules.heap_vecs or rules.heap_limits:
+            window.apply_heap(rules)
+
+class ArraySim(BaseSim):
+    """Particle simulation stored as NumPy arrays and updated with whole-grid passes.
+
+    This is an alternate engine to `ParticleSim` meant for large worlds. Instead of a grid of
+    particle objects that each update themselves, the grid is stored as typed arrays (species id,
+    color variant, active/stuck flags, and per-cell random draws), and gravity and heap movement
+    are applied to every particle of a species at once. Particles are still described by the
+    particle classes in `pyparticles.objects`; their behaviour parameters are read once per class
+    when the first particle of that class is added.
+
+    Each gravity or heap vector is applied as its own pass, so a particle only moves into cells
+    that were empty before the pass started and no two particles can claim the same cell. Cells
+    that moved this step wake every particle within reach of them, which stands in for the
+    per-particle dependant lists used by `ParticleSim`.
+
+    The grid is stepped in horizontal stripes of `stripe_height` rows, first the even stripes and
+    then the odd ones. Stripes stepped in the same phase never touch the same cells, so when
+    `workers` is above 0 the grid is kept in shared memory and each phase is split between a pool
+    of worker processes. All the random draws for a step are made up front, so the results are
+    the same for a given seed no matter how many workers are used. Call `close()` to shut the
+    workers down once the simulation is no longer needed, or use the simulation as a context
+    manager, which closes it on exit.
+
+    Args:
+        sim_size (tuple): Grid size of the simulation.
+        cell_size (tuple): Pixel size of each grid cell.
+        bg_img (pygame.Surface): Background image for the simulation. Defaults to None.
+        bg_clr (pygame.Color): Background color for the simulation. Defaults to None.
+        seed (int): Seed for the random draws made by the simulation. Defaults to None.
+        workers (int): Number of worker processes used to step the grid. Defaults to 0, which
+            steps the grid in this process.
+        stripe_height (int): Number of rows in each stripe. Defaults to 32.
+        headless (bool): Whether or not the simulation is never drawn. Headless simulations
+            don't have `image` or a palette, and don't need pygame. Defaults to False.
+
+    Attributes:
+        image (pygame.Surface): The image corresponding to the current simulation state, or None
+            if the simulation is headless.
+    """
+
+    def __init__(self, sim_size, cell_size, bg_img=None, bg_clr=None, seed=None, workers=0,
+        stripe_height=32, headless=False):
+        super().__init__(sim_size, cell_size, bg_img, bg_clr, headless=headless)
+        shape = (self._sim_size.y, self._sim_size.x)
+        self._pool = None
+        if workers > 0:
+            # only pull in multiprocessing when it's actually used
+            from pyparticles.engine.parallel import StripePool
+            self._pool = StripePool(shape, workers)
+            self._set_arrays(self._pool.arrays)
+        else:
+            self._set_arrays({
+                name: np.zeros(lead + shape, dtype=dtype)
+                for name, (lead, dtype) in GRID_ARRAYS.items()})
+        self._stripe_height = stripe_height
+        self._rng = np.random.default_rng(seed)
+        # species lookup, indexed by species id (id 0 is reserved for empty cells)
+        self._species_list = [None]
+        self._species_ids = {}
+        self._wake_radius = 1
+        # counters for `stats`, reset at the end of each step
+        self._added = 0
+        self._removed = 0
+        self._palette = None
+        self._cell_image = None
+        self._scaled_image = None
+        if self.image is not None:
+            self._build_palette()
+            # surfaces used to draw the grid at 1 pixel per cell and then scale it up
+            self._cell_image = pygame.Surface((self._sim_size.x, self._sim_size.y))
+            self._scaled_image = pygame.Surface(self.image.get_size())
+            self._scaled_image.set_colorkey(_COLOR_KEY)
+
+    def _set_arrays(self, arrays):
+        """Set the arrays the grid is stored in.
+
+        Args:
+            arrays (dict[str, numpy.ndarray]): The arrays, keyed by the names in `GRID_ARRAYS`.
+        """
+        self._arrays = arrays
+        self._species = arrays['species']
+        self._variant = arrays['variant']
+        self._active = arrays['active']
+        self._stuck = arrays['stuck']
+        self._new = arrays['new']
+        self._moved = arrays['moved']
+        self._changed = arrays['changed']
+        self._updateable = arrays['updateable']
+        self._rand = arrays['rand']
+        self._offsets = arrays['offsets']
+
+    def close(self):
+        """Shut down the worker processes, if any.
+
+        The grid is copied out of shared memory first, so the simulation can keep being stepped
+        in this process afterwards.
+        """
+        if self._pool is None:
+            return
+        self._set_arrays({name: arr.copy() for name, arr in self._arrays.items()})
+        self._pool.close()
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_species(self, particle_type):
+        """Register a particle type with the simulation.
+
+        Particle types are registered automatically when they are first added, so this only needs
+        to be called to control which id a species gets.
+
+        Args:
+            particle_type (type): The particle class to register.
+
+        Returns:
+            int: The species id of the particle type.
+        """
+        if particle_type in self._species_ids:
+            return self._species_ids[particle_type]
+        species = _Species(len(self._species_list), particle_type)
+        self._species_list.append(species)
+        self._species_ids[particle_type] = species.id
+        for vec in species.rules.vectors():
+            self._wake_radius = max(self._wake_radius, abs(vec[0]), abs(vec[1]))
+        if self.image is not None:
+            # rebuild the palette so it has room for the new species and its color variants
+            self._build_palette()
+        return species.id
+
+    def _build_palette(self):
+        """Build the table of colors `draw()` looks up by species id and color variant."""
+        variants = max((len(s.colors) for s in self._species_list[1:]), default=1)
+        palette = np.zeros((len(self._species_list), variants, 3), dtype=np.uint8)
+        palette[_EMPTY] = _COLOR_KEY
+        for s in self._species_list[1:]:
+            for i in range(variants):
+                palette[s.id, i] = tuple(pygame.Color(s.colors[i % len(s.colors)]))[:3]
+        self._palette = palette
+
+    def get_cell(self, pos):
+        """Return the particle type held at a given grid position. Clamps the position if needed.
+
+        Args:
+            pos (Point, Point-like): The grid position to retrieve the value of.
+
+        Returns:
+            type: The particle class of the particle located at the given grid position.
+            None: Returns `None` if there's no particle at the given grid position.
+        """
+        x, y = as_xy(pos)
+        if not self.in_bounds((x, y)):
+            x, y = self.clamp_pos((x, y))
+        species = self._species_list[self._species[y, x]]
+        if species is None:
+            return None
+        return species.particle_type
+
+    def is_active(self, pos):
+        """Check if the particle at a given grid position is active.
+
+        Args:
+            pos (Point, Point-like): The grid position to check.
+
+        Returns:
+            bool: True if there is an active particle at `pos`, False otherwise.
+        """
+        x, y = as_xy(pos)
+        return bool(self._active[y, x])
+
+    def is_stuck(self, pos):
+        """Check if the particle at a given grid position is stuck in its heap.
+
+        Args:
+            pos (Point, Point-like): The grid position to check.
+
+        Returns:
+            bool: True if there is a stuck particle at `pos`, False otherwise.
+        """
+        x, y = as_xy(pos)
+        return bool(self._stuck[y, x])
+
+    def _wake(self, x, y):
+        """Activate every particle within the wake radius of a grid position.
+
+        Args:
+            x (int): X value of the grid position that changed.
+            y (int): Y value of the grid position that changed.
+        """
+        r = self._wake_radius
+        area = (slice(max(0, y - r), y + r + 1), slice(max(0, x - r), x + r + 1))
+        self._active[area] |= self._species[area] != _EMPTY
+
+    def add_particle(self, particle, pos):
+        """Add a particle to the simulation at a given grid position.
+
+        Only the type (and heap state, if any) of the particle is kept. Newly added particles
+        won't be updated until the step after the next one, matching `ParticleSim`.
+
+        Args:
+            particle (BaseParticle): The particle to add.
+            pos (tuple): The grid position to add the particle at.
+
+        Returns:
+            bool: True if the particle was added, False otherwise.
+        """
+        x, y = as_xy(pos)
+        if self._species[y, x] != _EMPTY:
+            return False
+        species_id = self.add_species(type(particle))
+        species = self._species_list[species_id]
+        self._species[y, x] = species_id
+        self._variant[y, x] = self._rng.integers(len(species.colors))
+        self._stuck[y, x] = getattr(particle, 'stuck', False)
+        self._new[y, x] = True
+        self._wake(x, y)
+        self._added += 1
+        return True
+
+    def remove_particle(self, pos):
+        """Remove the particle at a given grid position.
+
+        Args:
+            pos (Point, Point-like): The grid position to clear.
+
+        Returns:
+            bool: True if a particle was removed, False otherwise.
+        """
+        x, y = as_xy(pos)
+        if self._species[y, x] == _EMPTY:
+            return False
+        self._species[y, x] = _EMPTY
+        self._active[y, x] = False
+        self._stuck[y, x] = False
+        self._new[y, x] = False
+        self._wake(x, y)
+        self._removed += 1
+        return True
+
+    def _region_mask(self, region):
+        """Get a boolean grid of the cells inside a region.
+
+        Args:
+            region (pygame.Rect, Circle, Mask, list[list[bool]], numpy.ndarray): The region.
+
+        Returns:
+            numpy.ndarray: Mask of the region, indexed as `[y, x]`.
+        """
+        mask = np.zeros_like(self._active)
+        if isinstance(region, np.ndarray) and region.shape == mask.shape:
+            mask[...] = region
+            return mask
+        cells = list(region_cells(region, (self._sim_size.x, self._sim_size.y)))
+        if cells:
+            xs, ys = zip(*cells)
+            mask[ys, xs] = True
+        return mask
+
+    def add_particles(self, region, factory):
+        """Fill every empty cell of a region with new particles.
+
+        `factory` is only called once, since only the type (and stuck state, if any) of the
+        particle it returns is kept.
+
+        Args:
+            region (pygame.Rect, Circle, Mask, list[list[bool]], numpy.ndarray): The cells to
+                fill. See `regions.region_cells()`.
+            factory (callable): Called with no arguments to create a particle, such as a
+                particle class.
+
+        Returns:
+            int: The number of particles added.
+        """
+        mask = self._region_mask(region) & (self._species == _EMPTY)
+        count = int(mask.sum())
+        if count == 0:
+            return 0
+        particle = factory()
+        species_id = self.add_species(type(particle))
+        species = self._species_list[species_id]
+        self._species[mask] = species_id
+        self._variant[mask] = self._rng.integers(len(species.colors), size=count)
+        self._stuck[mask] = getattr(particle, 'stuck', False)
+        self._new[mask] = True
+        self._active |= _dilate(mask, self._wake_radius) & (self._species != _EMPTY)
+        self._added += count
+        return count
+
+    def remove_particles(self, region):
+        """Remove every particle inside a region.
+
+        Args:
+            region (pygame.Rect, Circle, Mask, list[list[bool]], numpy.ndarray): The cells to
+                clear. See `regions.region_cells()`.
+
+        Returns:
+            int: The number of particles removed.
+        """
+        mask = self._region_mask(region) & (self._species != _EMPTY)
+        count = int(mask.sum())
+        if count == 0:
+            return 0
+        self._species[mask] = _EMPTY
+        self._active[mask] = False
+        self._stuck[mask] = False
+        self._new[mask] = False
+        self._active |= _dilate(mask, self._wake_radius) & (self._species != _EMPTY)
+        self._removed += count
+        return count
+
+    def update(self, **kwargs):
+        """Update the simulation by one step and redraw it.
+
+        This is the same as calling `step()` followed by `draw()`.
+
+        Args:
+            **kwargs (any): Unused. Accepted so this can be swapped in for `ParticleSim`.
+        """
+        self.step(**kwargs)
+        self.draw()
+
+    def step(self, **kwargs):
+        """Update all the particles in the simulation by one step, without redrawing anything.
+
+        Each stripe applies gravity to every species first, followed by heap movement. Particles
+        that didn't move, couldn't have moved, and aren't next to anything that moved are
+        deactivated. Newly added particles are drawn, but not updated.
+
+        Args:
+            **kwargs (any): Unused. Accepted so this can be swapped in for `ParticleSim`.
+
+        Returns:
+            int: The number of particles that were updated.
+        """
+        start = self.stats.begin_step()
+        count = int(np.count_nonzero(self._active & ~self._new))
+        was_active = self._active.copy()
+        self._rng.random(out=self._rand, dtype=np.float32)
+        self._offsets[...] = self._rng.integers(_OFFSET_RANGE, size=self._offsets.shape,
+            dtype=np.uint16)
+        self._moved[:] = False
+        self._changed[:] = False
+        self._updateable[:] = False
+        # stripes in the same phase must be far enough apart that they never touch the same cells
+        reach = self._wake_radius
+        height = max(self._stripe_height, 2 * reach)
+        rows = self._sim_size.y
+        stripes = [(top, min(top + height, rows)) for top in range(0, rows, height)]
+        rules_list = [species.rules for species in self._species_list[1:]]
+        updating = self._active & ~self._new
+        scanned = time.perf_counter()
+        for phase in (stripes[0::2], stripes[1::2]):
+            # skip stripes with nothing to update
+            phase = [(top, bottom) for top, bottom in phase if updating[top:bottom].any()]
+            if self._pool is not None:
+                self._pool.step(phase, reach, rules_list)
+                continue
+            for top, bottom in phase:
+                step_stripe(self._arrays, top, bottom, reach, rules_list)
+        updated_at = time.perf_counter()
+        occupied = self._species != _EMPTY
+        woken = _dilate(self._changed, self._wake_radius)
+        self._active[...] = occupied & (
+            self._moved | self._updateable | woken | (self._active & self._new))
+        self._new[:] = False
+        # particles are counted by cell, so a particle that moved counts as deactivating in its
+        # old cell if another particle took its place
+        self.stats.end_step(scanned - start + time.perf_counter() - updated_at,
+            updated_at - scanned, {
+                'active': int(np.count_nonzero(self._active)),
+                'moves': int(np.count_nonzero(self._moved)),
+                'wakeups': int(np.count_nonzero(self._active & ~was_active & ~self._moved)),
+                'deactivations': int(np.count_nonzero(was_active & ~self._active & occupied)),
+                'added': self._added,
+                'removed': self._removed,
+            })
+        self._added = 0
+        self._removed = 0
+        return count
+
+    def draw(self):
+        """Redraw the current sim state onto `image`.
+
+        The whole image is redrawn at once, so the entire image is added to `dirty_rects`.
+        Headless simulations aren't drawn, so this does nothing for them.
+        """
+        if self.image is None:
+            return
+        start = time.perf_counter()
+        colors = self._palette[self._species, self._variant]
+        pygame.surfarray.blit_array(self._cell_image, colors.transpose(1, 0, 2))
+        pygame.transform.scale(self._cell_image, self.image.get_size(), self._scaled_image)
+        self.image.blit(self._background, (0, 0))
+        self.image.blit(self._scaled_image, (0, 0))
+        self.dirty_rects = [self.image.get_rect()]
+        self.stats.add_draw_time(time.perf_counter() - start)
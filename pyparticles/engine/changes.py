@@ -0,0 +1,307 @@
+"""Per-step change stream for replaying or viewing simulations elsewhere.
+
+A change stream starts with a header, followed by one delta packet per step. Every number is
+stored little-endian, and every section starts on a 4 byte boundary.
+
+- Stream header: magic bytes `PPCS`, format version (uint16), padding (uint16), and the grid
+  width and height (uint32 each).
+- Delta header: magic bytes `PPDL`, format version (uint16), padding (uint16), the number of
+  steps the simulation had run, and the number of new species, moved particles, added particles,
+  and removed particles (uint32 each).
+- New species: each species seen for the first time, stored the same way as a snapshot's
+  species table, as its class's import path followed by the keyword arguments it was built with.
+  Species are numbered from 1 in the order they first appear in the stream.
+- Moved (2 uint32s per particle): the cell index the particle was in at the previous delta,
+  followed by the cell index it's in now. Cell indexes count row by row, as `y * width + x`.
+- Added (2 uint32s per particle): the cell index of the particle, followed by its species number.
+- Removed (uint32 per particle): the cell index the particle was in at the previous delta.
+
+Deltas are net changes since the previous delta, so a particle that moves several times during
+a step is only listed once, and a particle added and removed again isn't listed at all. To apply
+a delta, first empty the removed cells and the old cells of moved particles, then fill the new
+cells of moved and added particles.
+"""
+import struct
+import sys
+from array import array
+from pyparticles.engine.snapshot import species_record
+
+_STREAM_MAGIC = b'PPCS'
+_DELTA_MAGIC = b'PPDL'
+_VERSION = 2
+_STREAM_HEADER = struct.Struct('<4sHxxII')
+_DELTA_HEADER = struct.Struct('<4sHxxIIIII')
+_LENGTH = struct.Struct('<H')
+
+# origin of particles added since the previous delta
+_ADDED = -1
+
+def _padding(size):
+    return -size % 4
+
+def _as_little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+class Delta():
+    """Changes made to a simulation's grid between two calls to `pop_changes()`.
+
+    Attributes:
+        step (int): Number of steps the simulation had run when the delta was taken.
+        species (list[tuple[str, str]]): Species table entries of the species that appear for
+            the first time in this delta, in the order they're numbered. See
+            `snapshot.species_record()`.
+        moved (array.array): Consecutive pairs of old and new cell indexes of moved particles.
+        added (array.array): Consecutive pairs of cell indexes and species numbers of added
+            particles.
+        removed (array.array): Old cell indexes of removed particles.
+    """
+
+    def __init__(self, step=0, species=None, moved=None, added=None, removed=None):
+        self.step = step
+        self.species = species if species is not None else []
+        self.moved = moved if moved is not None else array('I')
+        self.added = added if added is not None else array('I')
+        self.removed = removed if removed is not None else array('I')
+
+    def pack(self):
+        """Pack the delta into the binary format described in the module docstring.
+
+        Returns:
+            bytes: The packed delta.
+        """
+        parts = [_DELTA_HEADER.pack(_DELTA_MAGIC, _VERSION, self.step, len(self.species),
+            len(self.moved) // 2, len(self.added) // 2, len(self.removed))]
+        written = 0
+        for record in self.species:
+            for text in record:
+                encoded = text.encode('utf-8')
+                parts.append(_LENGTH.pack(len(encoded)))
+                parts.append(encoded)
+                written += _LENGTH.size + len(encoded)
+        parts.append(bytes(_padding(written)))
+        for values in (self.moved, self.added, self.removed):
+            parts.append(_as_little_endian(values).tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def read(cls, stream):
+        """Read a packed delta from a binary stream.
+
+        Args:
+            stream (io.BufferedIOBase): The stream to read from, such as an open file or a
+                socket's `makefile('rb')`.
+
+        Returns:
+            Delta: The delta, or None if the stream ended before the delta started.
+        """
+        header = _read_exact(stream, _DELTA_HEADER.size, allow_eof=True)
+        if header is None:
+            return None
+        magic, version, step, n_species, n_moved, n_added, n_removed = \
+            _DELTA_HEADER.unpack(header)
+        if magic != _DELTA_MAGIC:
+            raise ValueError('Stream data is not a simulation delta')
+        if version != _VERSION:
+            raise ValueError(f'Unsupported delta version {version}')
+        species = []
+        read = 0
+        for _ in range(n_species):
+            record = []
+            for _ in range(2):
+                length, = _LENGTH.unpack(_read_exact(stream, _LENGTH.size))
+                record.append(_read_exact(stream, length).decode('utf-8'))
+                read += _LENGTH.size + length
+            species.append(tuple(record))
+        _read_exact(stream, _padding(read))
+        sections = []
+        for count in (2 * n_moved, 2 * n_added, n_removed):
+            values = array('I')
+            values.frombytes(_read_exact(stream, count * values.itemsize))
+            if sys.byteorder != 'little':
+                values.byteswap()
+            sections.append(values)
+        return cls(step, species, *sections)
+
+    def apply(self, cells):
+        """Apply the delta to a grid of species numbers.
+
+        Args:
+            cells (array.array, list[int]): Species number of each cell, row by row, with 0 for
+                empty cells. Changed in place.
+        """
+        moved = self.moved
+        moved_species = [cells[old] for old in moved[::2]]
+        for old in moved[::2]:
+            cells[old] = 0
+        for index in self.removed:
+            cells[index] = 0
+        for new, species_id in zip(moved[1::2], moved_species):
+            cells[new] = species_id
+        added = self.added
+        for index, species_id in zip(added[::2], added[1::2]):
+            cells[index] = species_id
+
+def _read_exact(stream, size, allow_eof=False):
+    """Read an exact number of bytes from a stream.
+
+    Returns:
+        bytes: The data read, or None if `allow_eof` is True and the stream ended first.
+    """
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            if allow_eof and not data:
+                return None
+            raise ValueError('Change stream is truncated')
+        data += more
+    return data
+
+class ChangeTracker():
+    """Records the changes made to a simulation's grid, for building deltas.
+
+    Simulations create this in `track_changes()` and report every move, addition, and removal to
+    it while it's attached. Only the first position of each particle since the previous delta is
+    kept, so the cost of tracking doesn't grow with the number of times a particle moves.
+
+    Args:
+        width (int): Width of the simulation's grid.
+    """
+
+    def __init__(self, width):
+        self._width = width
+        # cell index each particle was in at the previous delta, or `_ADDED` for new particles
+        self._origins = {}
+        self._removed = array('I')
+        self._species_ids = {}
+        self._new_species = []
+
+    def moved(self, particle, old_pos):
+        """Record that a particle moved. Called by the simulation before `pos` changes."""
+        if particle not in self._origins:
+            self._origins[particle] = old_pos[1] * self._width + old_pos[0]
+
+    def added(self, particle):
+        """Record that a particle was added. Called by the simulation."""
+        self._origins[particle] = _ADDED
+
+    def removed(self, particle, pos):
+        """Record that a particle was removed from a grid position. Called by the simulation."""
+        origin = self._origins.pop(particle, None)
+        if origin is None:
+            origin = pos[1] * self._width + pos[0]
+        if origin != _ADDED:
+            self._removed.append(origin)
+
+    def pop(self, step):
+        """Build a delta of the changes since this was last called, then start a new one.
+
+        Args:
+            step (int): Number of steps the simulation has run.
+
+        Returns:
+            Delta: The changes since the previous delta.
+        """
+        width = self._width
+        species_ids = self._species_ids
+        moved = array('I')
+        added = array('I')
+        for p, origin in self._origins.items():
+            x, y = p.pos
+            index = y * width + x
+            if origin == _ADDED:
+                species_id = species_ids.get(p.species)
+                if species_id is None:
+                    species_id = species_ids[p.species] = len(species_ids) + 1
+                    self._new_species.append(species_record(type(p), p.species.kwargs))
+                added.append(index)
+                added.append(species_id)
+            elif origin != index:
+                moved.append(origin)
+                moved.append(index)
+        delta = Delta(step, self._new_species, moved, added, self._removed)
+        self._origins = {}
+        self._removed = array('I')
+        self._new_species = []
+        return delta
+
+class ChangeWriter():
+    """Writes a change stream to a binary file or a connected socket.
+
+    The stream header is written straight away, then each delta is written with a single call,
+    so deltas can be streamed to a live viewer as they're made. Writers can be used as context
+    managers, which closes them on exit.
+
+    Args:
+        stream (io.BufferedIOBase, socket.socket): Where to write the stream. Anything with a
+            `write()` or `sendall()` method works.
+        size (tuple[int, int]): Width and height of the simulation's grid.
+    """
+
+    def __init__(self, stream, size):
+        self._stream = stream
+        self._send = getattr(stream, 'sendall', None) or stream.write
+        self._send(_STREAM_HEADER.pack(_STREAM_MAGIC, _VERSION, size[0], size[1]))
+
+    def write(self, delta):
+        """Write a delta to the stream.
+
+        Args:
+            delta (Delta): The delta to write.
+        """
+        self._send(delta.pack())
+
+    def close(self):
+        """Flush and close the underlying stream."""
+        flush = getattr(self._stream, 'flush', None)
+        if flush is not None:
+            flush()
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ChangeReader():
+    """Reads a change stream written by `ChangeWriter`.
+
+    Iterating over a reader yields each delta in the stream until it ends. The reader keeps the
+    full species table and a grid of species numbers up to date as deltas are read.
+
+    Args:
+        stream (io.BufferedIOBase): The stream to read from, such as an open file or a socket's
+            `makefile('rb')`.
+
+    Attributes:
+        size (tuple[int, int]): Width and height of the simulation's grid.
+        species (list[tuple[str, str]]): Species table entries of every species seen so far,
+            which `snapshot.load_species()` accepts. Species number `n` is `species[n - 1]`.
+        cells (array.array): Species number of each cell, row by row, after the most recently
+            read delta.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        magic, version, width, height = _STREAM_HEADER.unpack(
+            _read_exact(stream, _STREAM_HEADER.size))
+        if magic != _STREAM_MAGIC:
+            raise ValueError('Stream is not a simulation change stream')
+        if version != _VERSION:
+            raise ValueError(f'Unsupported change stream version {version}')
+        self.size = (width, height)
+        self.species = []
+        self.cells = array('H', bytes(2 * width * height))
+
+    def __iter__(self):
+        while True:
+            delta = Delta.read(self._stream)
+            if delta is None:
+                return
+            self.species.extend(delta.species)
+            delta.apply(self.cells)
+            yield delta
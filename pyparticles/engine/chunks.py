@@ -0,0 +1,150 @@
+from collections import namedtuple
+
+# area of the grid covered by a chunk, in grid cells
+GridRect = namedtuple('GridRect', ('x', 'y', 'width', 'height'))
+
+class Chunk():
+    """A square section of a simulation's grid that can be put to sleep.
+
+    Chunks track which particles are inside them and whether anything inside them changed during
+    the current step. A sleeping chunk is skipped entirely by the simulation until it's woken up,
+    either by a neighbouring chunk changing, a particle being added or removed inside it, or one
+    of its particles being activated.
+
+    Args:
+        rect (GridRect, tuple): The grid area covered by this chunk, as
+            `(left, top, width, height)`.
+        awake_chunks (dict[Chunk, None]): The simulation's (ordered) set of awake chunks, which
+            this chunk adds itself to when woken up.
+
+    Attributes:
+        rect (GridRect): The grid area covered by this chunk.
+        particles (dict[BaseParticle, None]): Ordered set of the particles inside this chunk.
+        counts (dict[type, int]): Number of particles of each class inside this chunk.
+        neighbours (list[Chunk]): The chunks touching this one, including diagonals.
+        changed (bool): Whether or not a particle entered, left, was added to, or was removed
+            from this chunk during the current step.
+        active_count (int): Number of active particles in this chunk. Maintained by the
+            simulation.
+    """
+
+    def __init__(self, rect, awake_chunks):
+        self.rect = GridRect(*rect)
+        self.particles = {}
+        self.counts = {}
+        self.neighbours = []
+        self.changed = False
+        self.active_count = 0
+        self._awake_chunks = awake_chunks
+
+    @property
+    def awake(self):
+        return self in self._awake_chunks
+
+    def wake(self):
+        self._awake_chunks[self] = None
+
+    def sleep(self):
+        self._awake_chunks.pop(self, None)
+
+    def add(self, particle):
+        self.particles[particle] = None
+        particle_type = type(particle)
+        self.counts[particle_type] = self.counts.get(particle_type, 0) + 1
+        particle.chunk = self
+        self.changed = True
+        self.wake()
+
+    def remove(self, particle):
+        if self.particles.pop(particle, False) is None:
+            particle_type = type(particle)
+            count = self.counts[particle_type] - 1
+            if count:
+                self.counts[particle_type] = count
+            else:
+                del self.counts[particle_type]
+        particle.chunk = None
+        self.changed = True
+        self.wake()
+
+def _chunk_rect(x, y, sim_size, chunk_size):
+    """Get the grid area of a chunk, cropped to fit the grid.
+
+    Args:
+        x (int): X value of the chunk's coordinates.
+        y (int): Y value of the chunk's coordinates.
+        sim_size (Point): Grid size of the simulation.
+        chunk_size (int): Width and height of each chunk.
+
+    Returns:
+        GridRect: The grid area covered by the chunk.
+    """
+    left, top = x * chunk_size, y * chunk_size
+    return GridRect(left, top, min(chunk_size, sim_size.x - left),
+        min(chunk_size, sim_size.y - top))
+
+def make_chunks(sim_size, chunk_size, awake_chunks):
+    """Split a grid into chunks and link each chunk to its neighbours.
+
+    Args:
+        sim_size (Point): Grid size of the simulation.
+        chunk_size (int): Width and height of each chunk. Chunks along the right and bottom
+            edges are cropped to fit the grid.
+        awake_chunks (dict[Chunk, None]): The simulation's (ordered) set of awake chunks.
+
+    Returns:
+        list[list[Chunk]]: 2D list of chunks, indexed as `[y][x]` in chunk coordinates.
+    """
+    rows = -(-sim_size.y // chunk_size)
+    cols = -(-sim_size.x // chunk_size)
+    chunks = [
+        [Chunk(_chunk_rect(x, y, sim_size, chunk_size), awake_chunks) for x in range(cols)]
+        for y in range(rows)]
+    for y in range(rows):
+        for x in range(cols):
+            for ny in range(max(0, y-1), min(rows, y+2)):
+                for nx in range(max(0, x-1), min(cols, x+2)):
+                    if nx != x or ny != y:
+                        chunks[y][x].neighbours.append(chunks[ny][nx])
+    return chunks
+
+def add_chunk(chunks, key, sim_size, chunk_size, awake_chunks):
+    """Create a chunk in a sparse set of chunks and link it to its existing neighbours.
+
+    Sparse simulations only keep chunks that hold particles, so chunks are created when they're
+    first written to, and neighbours are linked as they're created instead of all at once.
+
+    Args:
+        chunks (dict[tuple[int, int], Chunk]): The existing chunks, keyed by chunk coordinates.
+            The new chunk is added to this.
+        key (tuple[int, int]): Chunk coordinates of the new chunk.
+        sim_size (Point): Grid size of the simulation.
+        chunk_size (int): Width and height of each chunk.
+        awake_chunks (dict[Chunk, None]): The simulation's (ordered) set of awake chunks.
+
+    Returns:
+        Chunk: The new chunk.
+    """
+    x, y = key
+    chunk = Chunk(_chunk_rect(x, y, sim_size, chunk_size), awake_chunks)
+    for ny in range(y-1, y+2):
+        for nx in range(x-1, x+2):
+            n = chunks.get((nx, ny))
+            if n is not None:
+                chunk.neighbours.append(n)
+                n.neighbours.append(chunk)
+    chunks[key] = chunk
+    return chunk
+
+def remove_chunk(chunks, key):
+    """Remove a chunk from a sparse set of chunks and unlink it from its neighbours.
+
+    Args:
+        chunks (dict[tuple[int, int], Chunk]): The existing chunks, keyed by chunk coordinates.
+        key (tuple[int, int]): Chunk coordinates of the chunk to remove.
+    """
+    chunk = chunks.pop(key)
+    chunk.sleep()
+    for n in chunk.neighbours:
+        n.neighbours.remove(chunk)
+    chunk.neighbours = []
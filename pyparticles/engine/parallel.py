@@ -0,0 +1,108 @@
+import weakref
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from pyparticles.engine import arraysim
+
+# arrays of the simulation a worker process is attached to, keyed by the names in GRID_ARRAYS
+_worker_arrays = None
+# shared memory blocks backing `_worker_arrays`, kept so they aren't closed while in use
+_worker_blocks = None
+
+def _attach(specs):
+    """Attach a worker process to the shared memory blocks of a simulation.
+
+    Args:
+        specs (dict[str, tuple]): Shared memory name, shape, and dtype of each array, keyed by
+            the names in `GRID_ARRAYS`.
+    """
+    global _worker_arrays, _worker_blocks
+    _worker_arrays = {}
+    _worker_blocks = []
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=shm_name)
+        _worker_blocks.append(shm)
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _release(pool, blocks):
+    """Stop a pool's workers and free its shared memory blocks.
+
+    Args:
+        pool (multiprocessing.pool.Pool): The worker pool.
+        blocks (list[SharedMemory]): The shared memory blocks.
+    """
+    pool.terminate()
+    pool.join()
+    for shm in blocks:
+        shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # arrays still viewing the block keep it mapped until they're freed, but it's
+            # already unlinked so it goes away with them
+            pass
+
+def _step_stripe(top, bottom, reach, rules_list):
+    arraysim.step_stripe(_worker_arrays, top, bottom, reach, rules_list)
+
+class StripePool():
+    """Pool of worker processes that step stripes of an `ArraySim` grid held in shared memory.
+
+    The workers and shared memory are released by `close()`, on exit when the pool is used as a
+    context manager, or when the pool is garbage collected, so dropped pools don't leave shared
+    memory segments behind.
+
+    Args:
+        shape (tuple): Number of rows and columns in the grid.
+        workers (int): Number of worker processes to start.
+
+    Attributes:
+        arrays (dict[str, numpy.ndarray]): The grid's arrays, keyed by the names in
+            `GRID_ARRAYS`. These are backed by shared memory, so any changes made to them are
+            seen by the workers.
+    """
+
+    def __init__(self, shape, workers):
+        self.arrays = {}
+        self._blocks = []
+        specs = {}
+        for name, (lead, dtype) in arraysim.GRID_ARRAYS.items():
+            full_shape = lead + shape
+            size = int(np.prod(full_shape)) * np.dtype(dtype).itemsize
+            shm = SharedMemory(create=True, size=max(1, size))
+            self._blocks.append(shm)
+            self.arrays[name] = np.ndarray(full_shape, dtype=dtype, buffer=shm.buf)
+            self.arrays[name][...] = 0
+            specs[name] = (shm.name, full_shape, dtype)
+        self._pool = Pool(workers, initializer=_attach, initargs=(specs,))
+        self._finalizer = weakref.finalize(self, _release, self._pool, self._blocks)
+
+    def step(self, stripes, reach, rules_list):
+        """Step a set of stripes at the same time, and wait for all of them to finish.
+
+        The stripes must be far enough apart that they never touch the same cells.
+
+        Args:
+            stripes (list[tuple[int, int]]): First row and the row after the last row of each
+                stripe.
+            reach (int): Farthest distance any species' vectors reach.
+            rules_list (list[_Rules]): Rules of every species in the simulation.
+        """
+        self._pool.starmap(_step_stripe,
+            [(top, bottom, reach, rules_list) for top, bottom in stripes])
+
+    def close(self):
+        """Stop the workers and free the shared memory.
+
+        `arrays` can't be used after this is called.
+        """
+        self._pool.close()
+        self._pool.join()
+        self.arrays = {}
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
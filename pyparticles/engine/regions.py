@@ -0,0 +1,92 @@
+import sys
+from math import isqrt
+from pyparticles.engine.utils import as_xy
+
+class Circle():
+    """Circular region of grid cells.
+
+    A cell is inside the circle if its distance from the center is at most `radius`.
+
+    Args:
+        center (Point, Point-like): Grid position of the center of the circle.
+        radius (int): Radius of the circle, in grid cells.
+    """
+
+    def __init__(self, center, radius):
+        self.center = as_xy(center)
+        self.radius = int(radius)
+
+    def cells(self, sim_size):
+        """Get the grid positions inside the circle that are in bounds.
+
+        Args:
+            sim_size (tuple[int, int]): Grid size of the simulation.
+
+        Yields:
+            tuple[int, int]: The next grid position, row by row.
+        """
+        width, height = sim_size
+        cx, cy = self.center
+        r = self.radius
+        for y in range(max(0, cy - r), min(height, cy + r + 1)):
+            half = isqrt(r*r - (y - cy)**2)
+            for x in range(max(0, cx - half), min(width, cx + half + 1)):
+                yield (x, y)
+
+class Mask():
+    """Region of grid cells given by a 2D boolean mask.
+
+    Args:
+        mask (list[list[bool]], numpy.ndarray): Mask indexed as `[y][x]`. Cells that are True
+            are part of the region.
+        topleft (Point, Point-like): Grid position the top left of the mask lines up with.
+            Defaults to (0, 0).
+    """
+
+    def __init__(self, mask, topleft=(0, 0)):
+        self.mask = mask
+        self.topleft = as_xy(topleft)
+
+    def cells(self, sim_size):
+        """Get the grid positions inside the mask that are in bounds.
+
+        Args:
+            sim_size (tuple[int, int]): Grid size of the simulation.
+
+        Yields:
+            tuple[int, int]: The next grid position, row by row.
+        """
+        width, height = sim_size
+        left, top = self.topleft
+        for row_y, row in enumerate(self.mask):
+            y = top + row_y
+            if not 0 <= y < height:
+                continue
+            for col_x, inside in enumerate(row):
+                x = left + col_x
+                if inside and 0 <= x < width:
+                    yield (x, y)
+
+def region_cells(region, sim_size):
+    """Get the grid positions inside a region that are in bounds.
+
+    Args:
+        region (pygame.Rect, tuple, Circle, Mask, list[list[bool]], numpy.ndarray): The region.
+            Rects are in grid cells, and can also be given as `(left, top, width, height)`
+            tuples. A bare mask is lined up with the top left of the grid.
+        sim_size (tuple[int, int]): Grid size of the simulation.
+
+    Returns:
+        iterator[tuple[int, int]]: The grid positions inside the region, row by row.
+    """
+    if isinstance(region, (Circle, Mask)):
+        return region.cells(sim_size)
+    # Rects can only exist if pygame was already imported, so don't import it to check
+    pygame = sys.modules.get('pygame')
+    if pygame is not None and isinstance(region, pygame.Rect):
+        region = tuple(region)
+    if type(region) is tuple and len(region) == 4 and isinstance(region[0], int):
+        left, top, width, height = region
+        return ((x, y) for y in range(max(0, top), min(sim_size[1], top + height))
+            for x in range(max(0, left), min(sim_size[0], left + width)))
+    return Mask(region).cells(sim_size)
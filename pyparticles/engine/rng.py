@@ -0,0 +1,83 @@
+import random
+from itertools import permutations
+
+# permutations of up to this many items are looked up in a precomputed table, larger ones are
+# shuffled when they're drawn
+_MAX_TABLE_SIZE = 6
+
+class SimRandom():
+    """Seedable source of random draws for a simulation.
+
+    Uniform draws are generated in blocks of `block_size` and handed out one at a time, and a new
+    block is generated whenever the current one runs out. Permutations of small lists (like the
+    direction vectors of a particle) are picked from a table of every possible permutation, so
+    drawing one only costs a single uniform draw.
+
+    Every draw is made from this object's own generator, so two simulations created with the
+    same seed make the same draws in the same order.
+
+    Args:
+        seed (int): Seed for the generator. Defaults to None, which seeds from the system.
+        block_size (int): Number of uniform draws to generate at once. Defaults to 4096.
+    """
+
+    def __init__(self, seed=None, block_size=4096):
+        self._gen = random.Random(seed)
+        self._block_size = block_size
+        self._uniforms = iter(())
+        # tables of every permutation of `range(n)`, keyed by `n`
+        self._perm_tables = {}
+
+    def seed(self, seed=None):
+        """Reseed the generator and throw away any draws that were already generated.
+
+        Args:
+            seed (int): The new seed. Defaults to None, which seeds from the system.
+        """
+        self._gen.seed(seed)
+        self._uniforms = iter(())
+
+    def _refill(self):
+        rand = self._gen.random
+        self._uniforms = iter([rand() for _ in range(self._block_size)])
+
+    def random(self):
+        """Get the next uniform draw.
+
+        Returns:
+            float: A number from 0.0 (inclusive) to 1.0 (exclusive).
+        """
+        for value in self._uniforms:
+            return value
+        self._refill()
+        return next(self._uniforms)
+
+    def randrange(self, stop):
+        """Get a random integer from 0 (inclusive) to `stop` (exclusive).
+
+        Args:
+            stop (int): Upper bound of the draw.
+
+        Returns:
+            int: The random integer.
+        """
+        return int(self.random() * stop)
+
+    def permutation(self, n):
+        """Get a random ordering of the numbers from 0 to `n - 1`.
+
+        Args:
+            n (int): Number of items to order.
+
+        Returns:
+            tuple[int]: The numbers from 0 to `n - 1` in a random order. Callers must not
+                modify the result, since it may be shared with other draws.
+        """
+        if n > _MAX_TABLE_SIZE:
+            order = list(range(n))
+            self._gen.shuffle(order)
+            return tuple(order)
+        table = self._perm_tables.get(n)
+        if table is None:
+            table = self._perm_tables[n] = list(permutations(range(n)))
+        return table[int(self.random() * len(table))]
@@ -0,0 +1,205 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+import pygame
+
+# most redrawn areas kept in a list before they're replaced by a single full redraw
+_MAX_RECTS = 1024
+
+def _add_rects(rects, new_rects, full):
+    """Add redrawn areas to a list, replacing the list with the full area if it gets too long.
+
+    Args:
+        rects (list[pygame.Rect]): The list to add to.
+        new_rects (list[pygame.Rect]): The areas to add.
+        full (pygame.Rect): The full area of the image.
+    """
+    if len(rects) == 1 and rects[0] == full:
+        return
+    rects.extend(new_rects)
+    if len(rects) > _MAX_RECTS:
+        rects[:] = [full]
+
+class SimRunner():
+    """Steps a simulation on a background thread at a fixed tick rate.
+
+    The simulation is owned by the worker thread once the runner starts, so it must not be used
+    directly from any other thread until the runner stops. Edits are queued with `submit()` (or
+    the `add_particles()`/`remove_particles()` shortcuts) and applied between steps.
+
+    After every step the worker copies the areas of the simulation's image that were redrawn
+    into one of two frame buffers, then publishes it. The render loop reads the most recently
+    published buffer through `frame()`, which never waits on a step: the worker only writes to
+    the buffer that isn't published, and if the render loop is still reading that buffer from an
+    earlier frame, publishing is skipped until the next step.
+
+    Args:
+        sim (BaseSim): The simulation to run. Sparse and headless simulations aren't supported,
+            since they don't have a single image to copy.
+        tick_rate (float): Number of steps to run per second. Defaults to 24.
+
+    Attributes:
+        sim (BaseSim): The simulation being run.
+        tick_rate (float): Number of steps to run per second.
+        running (bool): Whether or not the worker thread is running.
+    """
+
+    def __init__(self, sim, tick_rate=24):
+        if sim.image is None:
+            raise ValueError('SimRunner needs a rendered simulation (not sparse or headless)')
+        self.sim = sim
+        self.tick_rate = tick_rate
+        self._edits = queue.SimpleQueue()
+        self._thread = None
+        self._stop = threading.Event()
+        # two copies of the simulation's image. The published one is `_front`, and each buffer
+        # has its own lock, held while it's being written to or read from. `_front` is only
+        # changed while holding `_swap_lock`
+        size = sim.image.get_size()
+        self._buffers = [pygame.Surface(size), pygame.Surface(size)]
+        for buf in self._buffers:
+            buf.blit(sim.image, (0, 0))
+        self._buffer_locks = [threading.Lock(), threading.Lock()]
+        self._front = 0
+        self._swap_lock = threading.Lock()
+        # areas of the simulation's image each buffer is missing, the areas that changed since
+        # the last frame was published, and the areas that changed since the render loop last
+        # read a frame
+        self._stale = [[], []]
+        self._unpublished = []
+        self._unread = [sim.image.get_rect()]
+        sim.pop_dirty_rects()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start stepping the simulation on the worker thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SimRunner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread and wait for it to finish its current step.
+
+        Edits that are still queued are applied before the thread exits.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._apply_edits()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a function to call with the simulation between steps.
+
+        The function is called on the worker thread as `func(sim, *args, **kwargs)`. If the
+        runner isn't running, it's called when the runner next starts or stops.
+
+        Args:
+            func (callable): The function to call.
+            *args (any): Positional arguments to pass after the simulation.
+            **kwargs (any): Keyword arguments to pass.
+
+        Returns:
+            concurrent.futures.Future: Resolves to whatever the function returns.
+        """
+        future = Future()
+        self._edits.put((future, func, args, kwargs))
+        return future
+
+    def add_particles(self, region, factory):
+        """Queue a call to the simulation's `add_particles()`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the number of particles added.
+        """
+        return self.submit(lambda sim: sim.add_particles(region, factory))
+
+    def remove_particles(self, region):
+        """Queue a call to the simulation's `remove_particles()`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the number of particles removed.
+        """
+        return self.submit(lambda sim: sim.remove_particles(region))
+
+    @contextmanager
+    def frame(self):
+        """Get the most recently published frame.
+
+        Use as a context manager, and only use the frame inside the `with` block:
+
+            with runner.frame() as (image, rects):
+                for r in rects:
+                    screen.blit(image, r, r)
+
+        Yields:
+            tuple[pygame.Surface, list[pygame.Rect]]: The frame, and the areas of it that
+                changed since the last call to this.
+        """
+        with self._swap_lock:
+            index = self._front
+            self._buffer_locks[index].acquire()
+            rects = self._unread
+            self._unread = []
+        try:
+            yield self._buffers[index], rects
+        finally:
+            self._buffer_locks[index].release()
+
+    def _apply_edits(self):
+        while True:
+            try:
+                future, func, args, kwargs = self._edits.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(self.sim, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _publish(self):
+        """Copy the areas of the simulation's image that changed into the back buffer, then
+        publish it if the render loop isn't using it.
+        """
+        rects = self.sim.pop_dirty_rects()
+        for pending in self._stale + [self._unpublished]:
+            _add_rects(pending, rects, self.sim.image.get_rect())
+        back = 1 - self._front
+        if not self._buffer_locks[back].acquire(blocking=False):
+            return
+        try:
+            buf = self._buffers[back]
+            for r in self._stale[back]:
+                buf.blit(self.sim.image, r, r)
+            self._stale[back] = []
+        finally:
+            self._buffer_locks[back].release()
+        with self._swap_lock:
+            _add_rects(self._unread, self._unpublished, self.sim.image.get_rect())
+            self._front = back
+        self._unpublished = []
+
+    def _run(self):
+        interval = 1 / self.tick_rate
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            self._apply_edits()
+            self.sim.update()
+            self._publish()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                # running behind, so skip the missed ticks instead of trying to catch up
+                next_tick = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
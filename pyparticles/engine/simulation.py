@@ -1,42 +1,133 @@
-import pygame
-from pyparticles.engine.utils import Point
+import time
+from array import array
+from functools import partial
+from itertools import accumulate, compress
+from pyparticles.engine import snapshot
+from pyparticles.engine.changes import ChangeTracker
+from pyparticles.engine.chunks import add_chunk, make_chunks, remove_chunk
+from pyparticles.engine.regions import region_cells
+from pyparticles.engine.rng import SimRandom
+from pyparticles.engine.stats import SimStats
+from pyparticles.engine.utils import Point, as_xy, lazy_import
 
-class ParticleSim():
-    """Self-contained particle simulation.
+# most removed particles of each species a simulation keeps around for reuse
+_POOL_LIMIT = 4096
 
-    On each call to `update()`, all particles in this simulation will be updated, then they will
-    be drawn onto an image that spans the entire simulation. By encapsulating the simulation like
-    this, it should be easier to change where the simulation is drawn within the program window
-    and to apply pan/zoom to the final image displayed to the user.
+# farthest a chain of particles updating the particles blocking them can reach, which keeps the
+# recursion well below Python's recursion limit
+_MAX_CHAIN_DEPTH = 128
+
+# ways a ParticleSim can draw its particles, where None doesn't draw them at all
+RENDER_MODES = ('sprites', 'palette', None)
+# palette index and color used for empty cells when drawing without sprites, which is then keyed
+# out to show the background
+_EMPTY_INDEX = 0
+_COLOR_KEY = (255, 0, 255)
+# number of colors an 8 bit surface can hold
+_PALETTE_SIZE = 256
+
+# only imported once something is drawn, so headless simulations don't need it
+pygame = lazy_import('pygame')
+
+class _SparseRow(dict):
+    """Row of a sparse simulation's grid, which only holds the cells that have a particle in them.
+
+    Reading an empty cell gives None, and writing None to a cell empties it, so rows can be used
+    the same way as the lists in a regular grid.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, x):
+        return None
+
+    def __setitem__(self, x, particle):
+        if particle is None:
+            self.pop(x, None)
+        else:
+            dict.__setitem__(self, x, particle)
+
+def _summed_area_table(values):
+    """Build a summed-area table from a 2D list of numbers.
+
+    Args:
+        values (list[list[int]]): The numbers, indexed as `[y][x]`.
+
+    Returns:
+        list[list[int]]: The table, with one more row and column than `values`. Entry `[y][x]` is
+            the sum of the numbers above and to the left of `values[y][x]`.
+    """
+    table = [[0] * (len(values[0]) + 1)]
+    for row in values:
+        sums = [0]
+        sums.extend(accumulate(row))
+        table.append([a + b for a, b in zip(table[-1], sums)])
+    return table
+
+def _table_sum(table, block):
+    """Get the sum of a block of a summed-area table's numbers.
+
+    Args:
+        table (list[list[int]]): The summed-area table.
+        block (tuple[int, int, int, int]): The left, top, right, and bottom edges of the block.
+
+    Returns:
+        int: The sum of the numbers inside the block.
+    """
+    left, top, right, bottom = block
+    return table[bottom][right] - table[top][right] - table[bottom][left] + table[top][left]
+
+class BaseSim():
+    """Base class for all simulations.
+
+    Handles the parts of a simulation that don't depend on how the grid is stored: converting
+    between grid and pixel positions, bounds checks, and the image/background the simulation is
+    drawn onto. Subclasses are responsible for storing particles and implementing `update()`.
 
     Args:
         sim_size (tuple): Grid size of the simulation.
         cell_size (tuple): Pixel size of each grid cell.
         bg_img (pygame.Surface): Background image for the simulation. Defaults to None.
         bg_clr (pygame.Color): Background color for the simulation. Defaults to None.
-        chunk_size (int): Size of smallest map chunks to use for optimization. Defaults to 8.
+        sparse (bool): Whether or not the simulation is drawn in tiles that are only created
+            where there's something to draw, instead of onto a single image. Sparse simulations
+            don't have `image`, and only support background colors. Defaults to False.
+        headless (bool): Whether or not the simulation is never drawn. Headless simulations
+            don't have `image` or a background, and don't need pygame. Defaults to False.
 
     Attributes:
-        image (pygame.Surface): The image corresponding to the current simulation state.
+        image (pygame.Surface): The image corresponding to the current simulation state, or
+            None if the simulation is sparse or headless. Use `get_area()` to read the image of
+            sparse simulations.
+        dirty_rects (list[pygame.Rect]): Areas of `image` that have been redrawn since the last
+            call to `pop_dirty_rects()`.
+        stats (SimStats): Timings and counters of the simulation's recent steps.
     """
 
-    # image: pygame.Surface
-
-    def __init__(self, sim_size, cell_size, bg_img=None, bg_clr=None):
-        # break the sim size into width and height, then make a 2D array of that size
+    def __init__(self, sim_size, cell_size, bg_img=None, bg_clr=None, sparse=False,
+        headless=False):
         self._sim_size = Point(sim_size)
-        self._sim_grid = [
-            [None for x in range(self._sim_size.x)]
-            for y in range(self._sim_size.y)]
         # break the cell size into width and height, then create a surface to draw the simulation
         # on. This surface will be big enough to draw the entire simulation on at 1x scale
         self._cell_width, self._cell_height = cell_size
-        img_size = (self._sim_size.x*self._cell_width, self._sim_size.y*self._cell_width)
+        img_size = (self._sim_size.x*self._cell_width, self._sim_size.y*self._cell_height)
+        self.stats = SimStats()
+        if headless:
+            self._image_rect = None
+            self.dirty_rects = []
+            self.image = None
+            self._background = None
+            return
+        self._image_rect = pygame.Rect((0, 0), img_size)
+        self.dirty_rects = [self._image_rect.copy()]
+        if sparse:
+            if bg_img is not None:
+                raise ValueError('Sparse simulations only support background colors')
+            self.image = None
+            self._background = None
+            self._bg_color = pygame.Color(bg_clr if bg_clr is not None else 'black')
+            return
         self.image = pygame.Surface(img_size)
-        # create a sprite group for all the particles and a list to track newly added particles
-        self._particle_group = pygame.sprite.Group()
-        self._update_group = pygame.sprite.Group()
-        self._new_particles = []
         # set the background image that will be used when redrawing the sim
         self._background = None
         if bg_img is not None:
@@ -48,6 +139,52 @@ class ParticleSim():
             print('Using default black background for sim')
             self._background = pygame.Surface(img_size)
             self._background.fill('black')
+        self.image.blit(self._background, (0, 0))
+
+    def new_particle(self, particle_type, **kwargs):
+        """Create a particle to add to this simulation.
+
+        Args:
+            particle_type (type): The class of particle to create.
+            **kwargs (any): Keyword arguments to create the particle with.
+
+        Returns:
+            BaseParticle: The new particle.
+        """
+        return particle_type(**kwargs)
+
+    def pop_dirty_rects(self):
+        """Get the areas of `image` that have been redrawn since this was last called.
+
+        This is meant to be passed to `pygame.display.update()` after copying the same areas of
+        `image` to the screen, so only the parts of the screen that changed are updated.
+
+        Returns:
+            list[pygame.Rect]: The redrawn areas of `image`.
+        """
+        rects = self.dirty_rects
+        self.dirty_rects = []
+        return rects
+
+    def get_image_rect(self):
+        """Get the pixel area covered by the simulation's image.
+
+        Returns:
+            pygame.Rect: The area of the image, which is the same size as the whole grid.
+        """
+        return self._image_rect.copy()
+
+    def get_area(self, area):
+        """Get the contents of an area of the simulation's image.
+
+        Args:
+            area (pygame.Rect): The pixel area to get. Parts outside the image are left out.
+
+        Returns:
+            pygame.Surface: The contents of the area. This may share its pixels with `image`,
+                so it's only valid until the simulation is drawn again.
+        """
+        return self.image.subsurface(area.clip(self._image_rect))
 
     def _get_abs_pos(self, pos):
         """Get the absolute/pixel position that corresponds to a given grid position.
@@ -58,9 +195,21 @@ class ParticleSim():
         Returns:
             Point: The absolute/grid position that corresponds to the given grid position.
         """
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        return Point(pos.x * self._cell_width, pos.y * self._cell_height)
+        x, y = as_xy(pos)
+        return Point(x * self._cell_width, y * self._cell_height)
+
+    def get_cell_rect(self, pos):
+        """Get the pixel area of a given grid cell.
+
+        Args:
+            pos (Point, Point-like): The grid position of the cell.
+
+        Returns:
+            pygame.Rect: The pixel area covered by the cell.
+        """
+        x, y = as_xy(pos)
+        return pygame.Rect(x * self._cell_width, y * self._cell_height,
+            self._cell_width, self._cell_height)
 
     def in_bounds(self, pos):
         """Check if a given grid position within the bounds of the grid.
@@ -71,9 +220,8 @@ class ParticleSim():
         Returns:
             bool: True if `pos` is in bounds, False otherwise.
         """
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        return Point(0, 0) <= pos < self._sim_size
+        x, y = as_xy(pos)
+        return 0 <= x < self._sim_size.x and 0 <= y < self._sim_size.y
 
     def clamp_pos(self, pos):
         """Clamps a given grid position to be within bounds of the grid.
@@ -88,6 +236,185 @@ class ParticleSim():
             pos = Point(pos)
         return pos.clamp((0,0), self._sim_size)
 
+    def get_pos(self, abs_pos):
+        """Get the grid position that corresponds to a given pixel position.
+
+        Args:
+            abs_pos (Point, Point-like): The pixel position to translate to a grid position.
+
+        Returns:
+            Point: The grid position that corresponds to the given pixel position.
+        """
+        x, y = as_xy(abs_pos)
+        return Point(x // self._cell_width, y // self._cell_height)
+
+class ParticleSim(BaseSim):
+    """Self-contained particle simulation.
+
+    On each call to `update()`, all particles in this simulation will be updated, then they will
+    be drawn onto an image that spans the entire simulation. By encapsulating the simulation like
+    this, it's easy to change where the simulation is drawn within the program window, and a
+    `Viewport` can apply pan/zoom to the final image displayed to the user.
+
+    Only active particles are updated. Particles register themselves with the simulation when
+    they're activated and unregister when they deactivate, so the cost of a step depends on the
+    number of active particles rather than the total number of particles.
+
+    The grid is split into chunks of `chunk_size` by `chunk_size` cells. Each chunk keeps count of
+    its active particles, and chunks where nothing moved and no particle is active are put to
+    sleep until they're woken up again by a neighbouring chunk changing, a particle being added or
+    removed inside them, or one of their particles being activated.
+
+    Only the cells that changed during a step are redrawn, and the areas that were redrawn are
+    added to `dirty_rects`. Particle images are clipped to their cell so a redrawn cell never
+    covers its neighbours.
+
+    Particles that are blocked by an active particle can update it first with `resolve_cell()`,
+    so a whole column of falling particles moves on the same step instead of one particle per
+    step. Each particle is still updated at most once per step.
+
+    Inactive particles wait on the cells they depend on, and are activated again when the
+    particle in one of those cells moves, is activated, or is removed. The simulation keeps
+    these waits in a cell-indexed graph, so registering a wait twice has no effect and the
+    waits of a cell or a particle can be looked up directly.
+
+    Removed particles are reset and kept in a free list for their species, and `new_particle()`
+    and `add_particles()` reuse them instead of creating new particles. A particle must not be
+    used again after it's removed.
+
+    Particles make their random draws from the simulation's `rng`, so two simulations with the
+    same seed that are filled and edited the same way end up with identical grids.
+
+    With the `'palette'` render mode, particle sprites aren't blitted at all. Instead, the grid
+    is kept as an 8 bit surface with one pixel per cell, where each pixel is an index into a
+    palette holding the average color of each particle image. Changed cells are written into it
+    directly, then the area they cover is scaled up to the cell size in a single call, so the
+    cost of drawing depends on the size of the changed area rather than the number of particles.
+    The palette holds up to 255 colors, and particle images past that are drawn with the closest
+    color already in it.
+
+    With the `None` render mode, nothing is drawn. The simulation has no image, `draw()` only
+    clears the cells waiting to be redrawn, and pygame is never imported, so headless workers
+    can step simulations of particles whose images are built on demand (like the ones in
+    `pyparticles.objects.particles`) without it.
+
+    Sparse simulations only store what's needed for the occupied part of the grid: each row of
+    the grid only holds its particles, and chunks are created along with a tile of the image
+    when a particle is first added or moved into them, then freed once they're empty and asleep.
+    There's no single image, so the simulation is read with `get_area()`. Sparse simulations
+    only support the `'sprites'` render mode and background colors.
+
+    Args:
+        sim_size (tuple): Grid size of the simulation.
+        cell_size (tuple): Pixel size of each grid cell.
+        bg_img (pygame.Surface): Background image for the simulation. Defaults to None.
+        bg_clr (pygame.Color): Background color for the simulation. Defaults to None.
+        chunk_size (int): Size of smallest map chunks to use for optimization. Defaults to 8.
+        seed (int): Seed for the random draws made by particles. Defaults to None.
+        render (str): How particles are drawn, either `'sprites'` to blit each particle's image,
+            `'palette'` to draw each cell as a single color, or None to not draw anything.
+            Defaults to `'sprites'`.
+        sparse (bool): Whether or not to only allocate storage for the occupied part of the
+            grid. Defaults to False.
+
+    Attributes:
+        image (pygame.Surface): The image corresponding to the current simulation state, or
+            None if the simulation is sparse or isn't drawn.
+        rng (SimRandom): Source of every random draw made by particles in this simulation.
+        view (pygame.Rect): Grid area that `draw()` redraws, such as the area visible through a
+            `Viewport`, or None to redraw the whole grid. Cells outside it that change are
+            redrawn once they're inside it. Defaults to None.
+    """
+
+    # image: pygame.Surface
+
+    def __init__(self, sim_size, cell_size, bg_img=None, bg_clr=None, chunk_size=8, seed=None,
+        render='sprites', sparse=False):
+        if render not in RENDER_MODES:
+            raise ValueError(f'Expected render to be one of {RENDER_MODES}, but got {render}')
+        if sparse and render == 'palette':
+            raise ValueError('Sparse simulations don\'t support the \'palette\' render mode')
+        super().__init__(sim_size, cell_size, bg_img, bg_clr, sparse, headless=render is None)
+        self.rng = SimRandom(seed)
+        self._sparse = sparse
+        # make a 2D array the size of the sim to hold the particles
+        if sparse:
+            self._sim_grid = [_SparseRow() for y in range(self._sim_size.y)]
+        else:
+            self._sim_grid = [
+                [None for x in range(self._sim_size.x)]
+                for y in range(self._sim_size.y)]
+        # split the grid into chunks. Awake chunks are kept in a dict so they're visited in a
+        # consistent order. Sparse simulations keep their chunks, and the image tile of each
+        # chunk, in dicts keyed by chunk coordinates
+        self._chunk_size = chunk_size
+        self._awake_chunks = {}
+        if sparse:
+            self._chunks = {}
+            self._tiles = {}
+        else:
+            self._chunks = make_chunks(self._sim_size, chunk_size, self._awake_chunks)
+        # ordered sets of all the particles, the active particles, and the particles added since
+        # the last step
+        self._particle_group = {}
+        self._active_particles = {}
+        self._new_particles = {}
+        # set of particles that have been updated (or are being updated) during the current step
+        self._visited = {}
+        self._chain_depth = 0
+        # ordered set of grid positions that need to be redrawn
+        self._dirty_cells = {}
+        # particles waiting on each cell, and the cells each waiting particle is waiting on
+        self._waiters = {}
+        self._waiting_on = {}
+        # counters for `stats`, reset at the end of each step
+        self._moves = 0
+        self._wakeups = 0
+        self._deactivations = 0
+        self._added = 0
+        self._removed = 0
+        # free lists of removed particles, keyed by species
+        self._pools = {}
+        # records changes for `pop_changes()` once `track_changes()` is called
+        self._changes = None
+        self._cell_area = None
+        if render is not None:
+            self._cell_area = pygame.Rect(0, 0, self._cell_width, self._cell_height)
+        self.view = None
+        self._render = render
+        if render == 'palette':
+            # the grid at 1 pixel per cell, plus the palette index of each particle image
+            self._cell_image = pygame.Surface((self._sim_size.x, self._sim_size.y), depth=8)
+            self._cell_image.set_palette([_COLOR_KEY] * _PALETTE_SIZE)
+            self._cell_image.fill(_EMPTY_INDEX)
+            self._palette = [_COLOR_KEY]
+            self._color_indices = {}
+        # bumped whenever a particle is added, removed, or moved to another chunk, and the
+        # summed-area tables of chunk populations with the version they were built at
+        self._layout_version = 0
+        self._count_table = None
+        self._species_tables = None
+
+    def _get_chunk(self, x, y):
+        """Get the chunk that contains a given grid position.
+
+        Args:
+            x (int): X value of the grid position to get the chunk of.
+            y (int): Y value of the grid position to get the chunk of.
+
+        Returns:
+            Chunk: The chunk containing the grid position. Sparse simulations create it if it
+                doesn't exist yet.
+        """
+        if self._sparse:
+            key = (x // self._chunk_size, y // self._chunk_size)
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                chunk = add_chunk(self._chunks, key, self._sim_size, self._chunk_size,
+                    self._awake_chunks)
+            return chunk
+        return self._chunks[y // self._chunk_size][x // self._chunk_size]
+
     def get_cell(self, pos):
         """Return the item held at a given grid position. Clamps the grid position if needed.
 
@@ -98,11 +425,10 @@ class ParticleSim():
             BaseParticle: The particle located at the given grid position.
             None: Returns `None` if there's no particle at the given grid position.
         """
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        if not self.in_bounds(pos):
-            pos = self.clamp_pos(pos)
-        return self._sim_grid[pos.y][pos.x]
+        x, y = as_xy(pos)
+        if not (0 <= x < self._sim_size.x and 0 <= y < self._sim_size.y):
+            x, y = self.clamp_pos(pos)
+        return self._sim_grid[y][x]
 
     def move_particle(self, particle, pos):
         """Moves a particle to a new grid position.
@@ -111,55 +437,715 @@ class ParticleSim():
             particle (BaseParticle): The particle to move.
             pos (Point, Point-like): The grid position to move the particle to.
         """
-        old = self.get_pos(particle.rect.topleft)
-        self._sim_grid[old.y][old.x] = None
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        self._sim_grid[pos.y][pos.x] = particle
-        particle.rect.topleft = tuple(self._get_abs_pos(pos))
+        old_pos = particle.pos
+        old_x, old_y = old_pos
+        self._sim_grid[old_y][old_x] = None
+        self._dirty_cells[old_pos] = None
+        self._moves += 1
+        if self._changes is not None:
+            self._changes.moved(particle, old_pos)
+        # waits belong to cells rather than particles, so the cell has to be woken before the
+        # particle leaves it. Cells that nothing waits on only cost the lookup
+        if old_pos in self._waiters:
+            self.wake_cell(old_pos)
+        pos = as_xy(pos)
+        x, y = pos
+        self._sim_grid[y][x] = particle
+        self._dirty_cells[pos] = None
+        particle.pos = pos
+        chunk = self._get_chunk(x, y)
+        if chunk is particle.chunk:
+            chunk.changed = True
+            return
+        if particle.active:
+            particle.chunk.active_count -= 1
+            chunk.active_count += 1
+        particle.chunk.remove(particle)
+        chunk.add(particle)
+        self._layout_version += 1
 
     def can_move(self, pos):
         return self.in_bounds(pos) and self.get_cell(pos) is None
 
-    def get_pos(self, abs_pos):
-        """Get the grid position that corresponds to a given pixel position.
+    def _get_count_table(self):
+        """Get the summed-area table of the number of particles in each chunk.
+
+        Entry `[cy][cx]` of the table is the number of particles in the chunks above and to the
+        left of chunk `(cx, cy)`. The table is rebuilt when it's asked for after particles were
+        added, removed, or moved between chunks.
+
+        Returns:
+            list[list[int]]: The table, with one more row and column than there are chunks.
+        """
+        if self._count_table is None or self._count_table[0] != self._layout_version:
+            self._count_table = (self._layout_version,
+                _summed_area_table([[len(c.particles) for c in row] for row in self._chunks]))
+        return self._count_table[1]
+
+    def _get_species_tables(self):
+        """Get a summed-area table of the number of particles of each class in each chunk, the
+        same way as `_get_count_table()`.
+
+        Returns:
+            dict[type, list[list[int]]]: The table of each particle class in the simulation.
+        """
+        if self._species_tables is None or self._species_tables[0] != self._layout_version:
+            counts = {}
+            cols = len(self._chunks[0])
+            for cy, row in enumerate(self._chunks):
+                for cx, chunk in enumerate(row):
+                    for particle_type, count in chunk.counts.items():
+                        if particle_type not in counts:
+                            counts[particle_type] = [[0] * cols for _ in self._chunks]
+                        counts[particle_type][cy][cx] = count
+            self._species_tables = (self._layout_version, {particle_type: _summed_area_table(c)
+                for particle_type, c in counts.items()})
+        return self._species_tables[1]
+
+    def _get_area_chunks(self, area):
+        """Split a grid area into a block of chunks it covers entirely, and the chunks along
+        its edges.
+
+        Sparse simulations don't keep summed-area tables, so every chunk is an edge chunk.
 
         Args:
-            abs_pos (Point, Point-like): The pixel position to translate to a grid position.
+            area (pygame.Rect, tuple): The grid area, as a Rect or a `(left, top, width, height)`
+                tuple.
 
         Returns:
-            Point: The grid position that corresponds to the given pixel position.
+            tuple: The area clipped to the grid as `(left, top, right, bottom)`, the block of
+                chunks entirely inside it as `(left, top, right, bottom)` chunk coordinates (or
+                None if there isn't one), and a list of the other chunks that overlap the area.
+                Chunks that don't exist in a sparse simulation are left out.
         """
-        if not isinstance(abs_pos, Point):
-            abs_pos = Point(abs_pos)
-        return Point(abs_pos.x // self._cell_width, abs_pos.y // self._cell_height)
+        left, top, width, height = area
+        right = min(self._sim_size.x, left + width)
+        bottom = min(self._sim_size.y, top + height)
+        left, top = max(0, left), max(0, top)
+        bounds = (left, top, right, bottom)
+        if left >= right or top >= bottom:
+            return bounds, None, []
+        size = self._chunk_size
+        rows = range(top // size, (bottom - 1) // size + 1)
+        cols = range(left // size, (right - 1) // size + 1)
+        if self._sparse:
+            if len(rows) * len(cols) <= len(self._chunks):
+                keys = ((cx, cy) for cy in rows for cx in cols)
+            else:
+                # fewer chunks exist than could overlap the area, so check each of them instead
+                keys = list(self._chunks)
+            chunks = self._chunks
+            return bounds, None, [chunks[key] for key in keys if key in chunks
+                and key[0] in cols and key[1] in rows]
+        # chunks cropped by the right and bottom edges of the grid still count as covered
+        block = (-(-left // size), -(-top // size),
+            right // size if right < self._sim_size.x else len(self._chunks[0]),
+            bottom // size if bottom < self._sim_size.y else len(self._chunks))
+        if block[0] >= block[2] or block[1] >= block[3]:
+            block = None
+        chunks = []
+        for cy in rows:
+            row = self._chunks[cy]
+            if block is not None and block[1] <= cy < block[3]:
+                chunks.extend(row[cx] for cx in cols if not block[0] <= cx < block[2])
+            else:
+                chunks.extend(row[cx] for cx in cols)
+        return bounds, block, chunks
+
+    def count_particles(self, area):
+        """Count the particles inside a grid area.
+
+        The chunks the area covers entirely are counted from a summed-area table of the number of
+        particles in each chunk, so only the chunks along the edges of the area are checked
+        particle by particle.
+
+        Args:
+            area (pygame.Rect, tuple): The grid area, as a Rect or a `(left, top, width, height)`
+                tuple. Parts outside the grid are left out.
+
+        Returns:
+            int: The number of particles inside the area.
+        """
+        (left, top, right, bottom), block, chunks = self._get_area_chunks(area)
+        total = 0
+        if block is not None:
+            total = _table_sum(self._get_count_table(), block)
+        for chunk in chunks:
+            for p in chunk.particles:
+                x, y = p.pos
+                if left <= x < right and top <= y < bottom:
+                    total += 1
+        return total
+
+    def is_area_empty(self, area):
+        """Check whether or not a grid area has no particles in it.
+
+        Args:
+            area (pygame.Rect, tuple): The grid area, as a Rect or a `(left, top, width, height)`
+                tuple. Parts outside the grid are left out.
+
+        Returns:
+            bool: True if there are no particles inside the area, False otherwise.
+        """
+        (left, top, right, bottom), block, chunks = self._get_area_chunks(area)
+        if block is not None and _table_sum(self._get_count_table(), block):
+            return False
+        for chunk in chunks:
+            for p in chunk.particles:
+                x, y = p.pos
+                if left <= x < right and top <= y < bottom:
+                    return False
+        return True
+
+    def get_species_counts(self, area):
+        """Count the particles of each class inside a grid area.
+
+        Dividing a count by the number of cells in the area gives the density of that kind of
+        particle. The chunks the area covers entirely are counted from a summed-area table for
+        each class, the same way as `count_particles()`.
+
+        Args:
+            area (pygame.Rect, tuple): The grid area, as a Rect or a `(left, top, width, height)`
+                tuple. Parts outside the grid are left out.
+
+        Returns:
+            dict[type, int]: Number of particles of each class inside the area. Classes without
+                any particles inside it are left out.
+        """
+        (left, top, right, bottom), block, chunks = self._get_area_chunks(area)
+        counts = {}
+        if block is not None:
+            for particle_type, table in self._get_species_tables().items():
+                count = _table_sum(table, block)
+                if count:
+                    counts[particle_type] = count
+        for chunk in chunks:
+            for p in chunk.particles:
+                x, y = p.pos
+                if left <= x < right and top <= y < bottom:
+                    counts[type(p)] = counts.get(type(p), 0) + 1
+        return counts
+
+    def find_empty_cell(self, pos, max_distance=None):
+        """Find the empty cell closest to a grid position.
+
+        Chunks are searched in rings around the position. Full chunks are skipped without
+        looking at their cells, and so are whole rings of them, using the summed-area table of
+        `count_particles()`. The search stops once no unsearched chunk could hold a closer cell.
+
+        Args:
+            pos (Point, Point-like): The grid position to search from. It's returned itself if
+                it's empty. Positions out of bounds are clamped to the grid.
+            max_distance (float): Farthest a cell can be from `pos` and still be returned.
+                Defaults to None, which searches the whole grid.
+
+        Returns:
+            tuple[int, int]: The closest empty grid position, or None if there isn't one in
+                range. Ties go to the cell found first.
+        """
+        px, py = as_xy(pos) if self.in_bounds(pos) else as_xy(self.clamp_pos(pos))
+        width, height = self._sim_size.x, self._sim_size.y
+        size = self._chunk_size
+        chunk_x, chunk_y = px // size, py // size
+        max_ring = max(chunk_x, chunk_y, (width - 1) // size - chunk_x,
+            (height - 1) // size - chunk_y)
+        limit = None if max_distance is None else max_distance * max_distance
+        table = None if self._sparse else self._get_count_table()
+        grid = self._sim_grid
+        best = None
+        best_distance = None
+        ring_cells = ring_count = 0
+        for ring in range(max_ring + 1):
+            # cells in this ring of chunks are at least this far from `pos` along one axis
+            nearest = max(0, (ring - 1) * size + 1)**2
+            if best_distance is not None and nearest > best_distance:
+                break
+            if limit is not None and nearest > limit:
+                break
+            if table is not None:
+                # skip the ring if every cell in it is full. The chunks inside it were counted
+                # as part of the previous rings
+                cols, rows = len(self._chunks[0]), len(self._chunks)
+                block = (max(0, chunk_x - ring), max(0, chunk_y - ring),
+                    min(cols, chunk_x + ring + 1), min(rows, chunk_y + ring + 1))
+                cells = ((min(width, block[2] * size) - block[0] * size)
+                    * (min(height, block[3] * size) - block[1] * size))
+                count = _table_sum(table, block)
+                full = count - ring_count == cells - ring_cells
+                ring_cells, ring_count = cells, count
+                if full:
+                    continue
+            for cy in range(chunk_y - ring, chunk_y + ring + 1):
+                step = 1 if cy in (chunk_y - ring, chunk_y + ring) else 2 * ring
+                for cx in range(chunk_x - ring, chunk_x + ring + 1, step):
+                    left, top = cx * size, cy * size
+                    if not (0 <= left < width and 0 <= top < height):
+                        continue
+                    if self._sparse:
+                        chunk = self._chunks.get((cx, cy))
+                    else:
+                        chunk = self._chunks[cy][cx]
+                    right, bottom = min(width, left + size), min(height, top + size)
+                    if chunk is None:
+                        # a missing sparse chunk is empty, so only its closest cell matters
+                        cells = [(min(max(px, left), right - 1), min(max(py, top), bottom - 1))]
+                    elif len(chunk.particles) == (right - left) * (bottom - top):
+                        continue
+                    else:
+                        cells = ((x, y) for y in range(top, bottom) for x in range(left, right)
+                            if grid[y][x] is None)
+                    for x, y in cells:
+                        distance = (x - px)**2 + (y - py)**2
+                        if limit is not None and distance > limit:
+                            continue
+                        if best_distance is None or distance < best_distance:
+                            best = (x, y)
+                            best_distance = distance
+        return best
 
     def update(self, **kwargs):
-        """Update the simulation by one step.
+        """Update the simulation by one step and redraw the cells that changed.
 
-        This updates all the particles in the simulation and redraws the current sim state.
-        Newly created/added particles won't be updated, but they will be drawn. This prevents
-        an 'invisible' first update from occuring. The new particles then have their `dirty`
-        attribute reset, since it doesn't reset automatically for some reason. This prevents
-        them from being stuck for an extra frame.
+        This is the same as calling `step()` followed by `draw()`.
 
         Args:
             **kwargs (any): Variable length list of keyword arguments. These arguments will be
                 passed into each particle's `update()` function.
         """
-        for p in self._particle_group:
-            if p in self._new_particles:
+        self.step(**kwargs)
+        self.draw()
+
+    def step(self, **kwargs):
+        """Update all the particles in the simulation by one step, without redrawing anything.
+
+        This updates all the active particles. Particles added since the last step won't be
+        updated until the next one, but they will be drawn, which prevents an 'invisible' first
+        update from occuring.
+
+        After updating, chunks that changed wake up their neighbours, and chunks that didn't
+        change and have no active particles are put to sleep.
+
+        Args:
+            **kwargs (any): Variable length list of keyword arguments. These arguments will be
+                passed into each particle's `update()` function.
+
+        Returns:
+            int: The number of particles that were updated.
+        """
+        start = self.stats.begin_step()
+        # particles added since the last step won't be updated until the next step
+        visited = self._visited
+        skipped = len(self._new_particles)
+        if skipped:
+            visited.update(self._new_particles)
+            self._new_particles.clear()
+        updating = list(self._active_particles)
+        scanned = time.perf_counter()
+        for p in updating:
+            # particles can be updated early by a particle they were blocking
+            if p in visited:
+                continue
+            visited[p] = None
+            p.update(**kwargs, sim=self)
+        updated_at = time.perf_counter()
+        updated = len(visited) - skipped
+        visited.clear()
+        self._sleep_chunks()
+        self.stats.end_step(scanned - start + time.perf_counter() - updated_at,
+            updated_at - scanned, self._pop_counters())
+        return updated
+
+    def _pop_counters(self):
+        """Get the counters for `stats` and reset them.
+
+        Returns:
+            dict[str, int]: The value of each counter since the last step.
+        """
+        counters = {
+            'active': len(self._active_particles),
+            'moves': self._moves,
+            'wakeups': self._wakeups,
+            'deactivations': self._deactivations,
+            'added': self._added,
+            'removed': self._removed,
+        }
+        self._moves = self._wakeups = self._deactivations = self._added = self._removed = 0
+        return counters
+
+    def resolve_cell(self, pos, **kwargs):
+        """Get the particle at a grid position, updating it first if it hasn't been updated yet.
+
+        This is used for chained physics resolution: a particle that's blocked by an active
+        particle updates the blocking particle first, so the blocking particle can get out of the
+        way during the same step. Particles that were already updated this step, inactive
+        particles, and particles added since the last step are returned without being updated.
+        Chains stop after `_MAX_CHAIN_DEPTH` particles.
+
+        Args:
+            pos (Point, Point-like): The grid position to resolve. Must be in bounds.
+            **kwargs (any): Variable length list of keyword arguments. These arguments will be
+                passed into the particle's `update()` function.
+
+        Returns:
+            BaseParticle: The particle located at the given grid position after resolving.
+            None: Returns `None` if there's no particle at the given grid position.
+        """
+        x, y = as_xy(pos)
+        p = self._sim_grid[y][x]
+        if p is None or not p.active or p in self._visited \
+                or self._chain_depth >= _MAX_CHAIN_DEPTH:
+            return p
+        self._visited[p] = None
+        self._chain_depth += 1
+        p.update(**kwargs)
+        self._chain_depth -= 1
+        return self._sim_grid[y][x]
+
+    def register_active(self, particle):
+        """Add a particle to the set of particles updated on each step.
+
+        Called by particles when they're activated. Does nothing if the particle is already
+        registered.
+
+        Args:
+            particle (BaseParticle): The particle that was activated.
+        """
+        if particle in self._active_particles:
+            return
+        self._active_particles[particle] = None
+        particle.chunk.active_count += 1
+        particle.chunk.wake()
+
+    def unregister_active(self, particle):
+        """Remove a particle from the set of particles updated on each step.
+
+        Called by particles when they deactivate. Does nothing if the particle isn't registered.
+
+        Args:
+            particle (BaseParticle): The particle that was deactivated.
+        """
+        if self._drop_active(particle):
+            self._deactivations += 1
+
+    def _drop_active(self, particle):
+        """Remove a particle from the set of particles updated on each step without counting it
+        as a deactivation.
+
+        Args:
+            particle (BaseParticle): The particle to remove.
+
+        Returns:
+            bool: True if the particle was registered, False otherwise.
+        """
+        if self._active_particles.pop(particle, False) is not False:
+            particle.chunk.active_count -= 1
+            return True
+        return False
+
+    def wait_on(self, particle, cells):
+        """Make a particle wait on a set of cells, replacing any cells it was waiting on before.
+
+        The particle will be activated by `wake_cell()` when any of the cells changes. Cells that
+        are out of bounds or empty are skipped, since there's nothing in them to change.
+
+        Args:
+            particle (BaseParticle): The waiting particle.
+            cells (list[tuple[int, int]]): The grid positions to wait on.
+        """
+        self._forget(particle)
+        width, height = self._sim_size.x, self._sim_size.y
+        grid = self._sim_grid
+        # a cell can be listed more than once, such as when a heap vector matches the gravity
+        # vector, but it's only waited on once
+        waiting_on = tuple(dict.fromkeys(pos for pos in cells
+            if 0 <= pos[0] < width and 0 <= pos[1] < height and grid[pos[1]][pos[0]] is not None))
+        if not waiting_on:
+            return
+        self._waiting_on[particle] = waiting_on
+        for pos in waiting_on:
+            waiters = self._waiters.get(pos)
+            if waiters is None:
+                waiters = self._waiters[pos] = {}
+            waiters[particle] = None
+
+    def _forget(self, particle):
+        """Remove every wait of a particle.
+
+        Args:
+            particle (BaseParticle): The particle to stop waiting.
+        """
+        for pos in self._waiting_on.pop(particle, ()):
+            waiters = self._waiters[pos]
+            del waiters[particle]
+            if not waiters:
+                del self._waiters[pos]
+
+    def wake_cell(self, pos):
+        """Activate every particle waiting on a cell, and every particle waiting on those.
+
+        The waiters of a cell are activated in the order they started waiting, and the cells of
+        the most recently activated particles are woken first. A particle is only activated once
+        per wait, since activating it drops all of its waits.
+
+        Args:
+            pos (tuple[int, int]): The grid position that changed.
+        """
+        stack = [pos]
+        while stack:
+            waiters = self._waiters.get(stack.pop())
+            if waiters is None:
                 continue
-            if p.active and p not in self._update_group:
-                self._update_group.add(p)
-            if not p.active and p in self._update_group:
-                self._update_group.remove(p)
-        #if len(self._particle_group) > 0:
-        #    print(f'Updating {100 * len(self._update_group) // len(self._particle_group)}% of all particles -- {len(self._update_group)} / {len(self._particle_group)}')
-        self._update_group.update(**kwargs, sim=self)
+            for p in list(waiters):
+                self._forget(p)
+                p.active = True
+                self.register_active(p)
+                self._wakeups += 1
+                stack.append(p.pos)
+
+    def get_waiters(self, pos):
+        """Get the particles waiting on a cell.
+
+        Args:
+            pos (Point, Point-like): The grid position.
+
+        Returns:
+            list[BaseParticle]: The particles that will be activated when the cell changes.
+        """
+        return list(self._waiters.get(as_xy(pos), ()))
+
+    def get_waiting_on(self, particle):
+        """Get the cells a particle is waiting on.
+
+        Args:
+            particle (BaseParticle): The particle.
+
+        Returns:
+            tuple[tuple[int, int]]: The grid positions that will activate the particle when they
+                change.
+        """
+        return self._waiting_on.get(particle, ())
+
+    def draw(self):
+        """Redraw every cell that changed since the last redraw.
+
+        If `view` is set, only the changed cells inside it are redrawn. Simulations that aren't
+        drawn only forget which cells changed.
+        """
+        if self._render is None:
+            self._dirty_cells = {}
+            return
+        start = time.perf_counter()
+        cells = self._pop_dirty_cells()
+        if self._render == 'palette':
+            self._draw_palette(cells)
+            self.stats.add_draw_time(time.perf_counter() - start)
+            return
+        if self._sparse:
+            self._draw_tiles(cells)
+            self.stats.add_draw_time(time.perf_counter() - start)
+            return
+        for x, y in cells:
+            rect = pygame.Rect(x*self._cell_width, y*self._cell_height,
+                self._cell_width, self._cell_height)
+            self.image.blit(self._background, rect, rect)
+            p = self._sim_grid[y][x]
+            if p is not None:
+                self.image.blit(p.image, rect, self._cell_area)
+            self.dirty_rects.append(rect)
+        self.stats.add_draw_time(time.perf_counter() - start)
+
+    def redraw(self):
+        """Redraw the entire sim state, instead of only the cells that changed."""
+        if self._render is None:
+            self._dirty_cells.clear()
+            return
+        if self._sparse:
+            self._tiles.clear()
+            self._draw_tiles({p.pos: None for p in self._particle_group})
+            self._dirty_cells.clear()
+            self.dirty_rects = [self.get_image_rect()]
+            return
+        if self._render == 'palette':
+            self._cell_image.fill(_EMPTY_INDEX)
+            indices = self._color_indices
+            with pygame.PixelArray(self._cell_image) as pixels:
+                for p in self._particle_group:
+                    index = indices.get(p.image)
+                    pixels[p.pos] = index if index is not None else self._color_index(p.image)
+            self._blit_cells(pygame.Rect(0, 0, self._sim_size.x, self._sim_size.y))
+            self._dirty_cells.clear()
+            self.dirty_rects = [self.image.get_rect()]
+            return
         self.image.blit(self._background, (0, 0))
-        self._particle_group.draw(self.image)
-        self._new_particles = []
+        cw, ch = self._cell_width, self._cell_height
+        self.image.blits([(p.image, (p.pos[0] * cw, p.pos[1] * ch), self._cell_area)
+            for p in self._particle_group], doreturn=False)
+        self._dirty_cells.clear()
+        self.dirty_rects = [self.image.get_rect()]
+
+    def _draw_tiles(self, cells):
+        """Redraw cells onto the image tiles of a sparse simulation.
+
+        Tiles are created for chunks that have a particle to draw. Empty cells in chunks without
+        a tile are left alone, since they're already showing the background.
+
+        Args:
+            cells (dict[tuple[int, int], None]): Ordered set of the grid positions to redraw.
+        """
+        size = self._chunk_size
+        cw, ch = self._cell_width, self._cell_height
+        grid = self._sim_grid
+        tiles = self._tiles
+        bg_color = self._bg_color
+        for x, y in cells:
+            p = grid[y][x]
+            key = (x // size, y // size)
+            tile = tiles.get(key)
+            if tile is None and p is not None:
+                chunk = self._chunks[key]
+                tile = tiles[key] = pygame.Surface((chunk.rect.width * cw, chunk.rect.height * ch))
+                tile.fill(bg_color)
+            if tile is not None:
+                rect = pygame.Rect((x % size) * cw, (y % size) * ch, cw, ch)
+                tile.fill(bg_color, rect)
+                if p is not None:
+                    tile.blit(p.image, rect, self._cell_area)
+            self.dirty_rects.append(pygame.Rect(x * cw, y * ch, cw, ch))
+
+    def get_area(self, area):
+        """Get the contents of an area of the simulation's image.
+
+        Sparse simulations build the area from the tiles that overlap it.
+
+        Args:
+            area (pygame.Rect): The pixel area to get. Parts outside the image are left out.
+
+        Returns:
+            pygame.Surface: The contents of the area. This may share its pixels with `image`,
+                so it's only valid until the simulation is drawn again.
+        """
+        if not self._sparse:
+            return super().get_area(area)
+        area = area.clip(self._image_rect)
+        surface = pygame.Surface(area.size)
+        surface.fill(self._bg_color)
+        tile_width = self._chunk_size * self._cell_width
+        tile_height = self._chunk_size * self._cell_height
+        cols = range(area.left // tile_width, (area.right - 1) // tile_width + 1)
+        rows = range(area.top // tile_height, (area.bottom - 1) // tile_height + 1)
+        if len(cols) * len(rows) <= len(self._tiles):
+            keys = ((x, y) for y in rows for x in cols)
+        else:
+            # fewer tiles exist than could overlap the area, so check each of them instead
+            keys = list(self._tiles)
+        surface.blits([(self._tiles[key], (key[0] * tile_width - area.x,
+            key[1] * tile_height - area.y)) for key in keys if key in self._tiles],
+            doreturn=False)
+        return surface
+
+    def _pop_dirty_cells(self):
+        """Get the cells that need to be redrawn, leaving cells outside `view` for later.
+
+        Returns:
+            dict[tuple[int, int], None]: Ordered set of the grid positions to redraw.
+        """
+        dirty = self._dirty_cells
+        view = self.view
+        if view is None:
+            self._dirty_cells = {}
+            return dirty
+        left, top, right, bottom = view.left, view.top, view.right, view.bottom
+        cells = {}
+        kept = {}
+        for pos in dirty:
+            if left <= pos[0] < right and top <= pos[1] < bottom:
+                cells[pos] = None
+            else:
+                kept[pos] = None
+        self._dirty_cells = kept
+        return cells
+
+    def _draw_palette(self, dirty):
+        """Write cells into the palette image, then redraw the area they cover.
+
+        Args:
+            dirty (dict[tuple[int, int], None]): Ordered set of the grid positions to redraw.
+        """
+        if not dirty:
+            return
+        grid = self._sim_grid
+        indices = self._color_indices
+        with pygame.PixelArray(self._cell_image) as pixels:
+            for pos in dirty:
+                p = grid[pos[1]][pos[0]]
+                if p is None:
+                    pixels[pos] = _EMPTY_INDEX
+                    continue
+                index = indices.get(p.image)
+                pixels[pos] = index if index is not None else self._color_index(p.image)
+        xs, ys = zip(*dirty)
+        left, top = min(xs), min(ys)
+        self.dirty_rects.append(self._blit_cells(
+            pygame.Rect(left, top, max(xs) - left + 1, max(ys) - top + 1)))
+
+    def _blit_cells(self, area):
+        """Scale an area of the palette image up to the cell size and draw it onto `image`.
+
+        Args:
+            area (pygame.Rect): The area to draw, in grid cells.
+
+        Returns:
+            pygame.Rect: The pixel area of `image` that was redrawn.
+        """
+        rect = pygame.Rect(area.x * self._cell_width, area.y * self._cell_height,
+            area.width * self._cell_width, area.height * self._cell_height)
+        scaled = pygame.transform.scale(self._cell_image.subsurface(area), rect.size)
+        scaled.set_colorkey(_EMPTY_INDEX)
+        self.image.blit(self._background, rect, rect)
+        self.image.blit(scaled, rect)
+        return rect
+
+    def _color_index(self, image):
+        """Get the palette index of a particle image, adding its color to the palette if needed.
+
+        Args:
+            image (pygame.Surface): The particle image.
+
+        Returns:
+            int: The palette index particles with this image are drawn with.
+        """
+        index = self._color_indices.get(image)
+        if index is not None:
+            return index
+        color = pygame.transform.average_color(image, self._cell_area.clip(image.get_rect()))[:3]
+        if len(self._palette) < _PALETTE_SIZE:
+            index = len(self._palette)
+            self._palette.append(color)
+            self._cell_image.set_palette_at(index, color)
+        else:
+            # the palette is full, so use the closest color in it, leaving out the color key
+            index = min(range(1, _PALETTE_SIZE), key=lambda i: sum(
+                (a - b)**2 for a, b in zip(self._palette[i], color)))
+        self._color_indices[image] = index
+        return index
+
+    def _sleep_chunks(self):
+        """Wake the neighbours of chunks that changed this step and put idle chunks to sleep."""
+        changed = []
+        for chunk in list(self._awake_chunks):
+            if chunk.changed:
+                chunk.changed = False
+                changed.append(chunk)
+            elif chunk.active_count == 0:
+                chunk.sleep()
+                if self._sparse and not chunk.particles:
+                    # free the storage of chunks that have nothing left in them
+                    key = (chunk.rect.x // self._chunk_size, chunk.rect.y // self._chunk_size)
+                    remove_chunk(self._chunks, key)
+                    self._tiles.pop(key, None)
+        for chunk in changed:
+            for n in chunk.neighbours:
+                n.wake()
 
     def add_particle(self, particle, pos):
         """Add a particle to the simulation at a given grid position.
@@ -173,22 +1159,394 @@ class ParticleSim():
         Returns:
             bool: True if the particle was added, False otherwise.
         """
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        if self._sim_grid[pos.y][pos.x] is not None:
+        pos = as_xy(pos)
+        x, y = pos
+        if self._sim_grid[y][x] is not None:
             return False
-        self._particle_group.add(particle)
-        self._sim_grid[pos.y][pos.x] = particle
-        particle.rect.topleft = tuple(self._get_abs_pos(pos))
-        self._new_particles.append(particle)
+        self._particle_group[particle] = None
+        self._sim_grid[y][x] = particle
+        particle.pos = pos
+        particle.sim = self
+        self._get_chunk(x, y).add(particle)
+        self._layout_version += 1
+        self._dirty_cells[pos] = None
+        if particle.active:
+            self.register_active(particle)
+        self._new_particles[particle] = None
+        self._added += 1
+        if self._changes is not None:
+            self._changes.added(particle)
         return True
 
     def remove_particle(self, pos):
-        if not isinstance(pos, Point):
-            pos = Point(pos)
-        if self._sim_grid[pos.y][pos.x] is None:
+        pos = as_xy(pos)
+        x, y = pos
+        if self._sim_grid[y][x] is None:
             return False
-        p = self._sim_grid[pos.y][pos.x]
+        p = self._sim_grid[y][x]
         p.activate()
-        p.kill()
-        self._sim_grid[pos.y][pos.x] = None
+        self._particle_group.pop(p, None)
+        self._drop_active(p)
+        self._forget(p)
+        self._new_particles.pop(p, None)
+        p.chunk.remove(p)
+        self._layout_version += 1
+        p.sim = None
+        self._sim_grid[y][x] = None
+        self._dirty_cells[pos] = None
+        self._removed += 1
+        if self._changes is not None:
+            self._changes.removed(p, pos)
+        self._recycle(p)
+
+    def new_particle(self, particle_type, **kwargs):
+        """Create a particle to add to this simulation, reusing a removed particle if possible.
+
+        A reused particle keeps its image, so keyword arguments that only affect a single
+        particle (such as `rng`) are ignored when one is reused.
+
+        Args:
+            particle_type (type): The class of particle to create.
+            **kwargs (any): Keyword arguments to create the particle with.
+
+        Returns:
+            BaseParticle: The new or reused particle.
+        """
+        pool = self._pools.get(particle_type.species_for(**kwargs))
+        if pool:
+            return pool.pop()
+        return particle_type(**kwargs)
+
+    def _recycle(self, particle):
+        """Reset a removed particle and add it to the free list of its species.
+
+        Args:
+            particle (BaseParticle): The particle that was removed.
+        """
+        pool = self._pools.get(particle.species)
+        if pool is None:
+            pool = self._pools[particle.species] = []
+        if len(pool) < _POOL_LIMIT:
+            particle.reset()
+            pool.append(particle)
+
+    def add_particles(self, region, factory):
+        """Fill every empty cell of a region with new particles.
+
+        This does the same thing as calling `add_particle()` for each cell, but the particle group,
+        chunks, and active set are updated once for the whole batch.
+
+        Args:
+            region (pygame.Rect, Circle, Mask, list[list[bool]], numpy.ndarray): The cells to
+                fill. See `regions.region_cells()`.
+            factory (callable): Called with no arguments to create each particle, such as a
+                particle class. If it's a particle class, removed particles of that class are
+                reused first, the same way `new_particle()` does, and new ones are created with
+                this simulation's `rng`.
+
+        Returns:
+            int: The number of particles added.
+        """
+        make = factory
+        if isinstance(factory, type):
+            pool = self._pools.get(factory.species_for())
+
+            def make():
+                return pool.pop() if pool else factory(rng=self.rng)
+        return len(self._add_batch(region_cells(region, (self._sim_size.x, self._sim_size.y)),
+            make))
+
+    def _add_batch(self, cells, factory):
+        """Fill a batch of empty grid positions with new particles, updating the particle group,
+        chunks, and active set once for the whole batch.
+
+        Args:
+            cells (iterable[tuple[int, int]]): The grid positions to fill. Positions that aren't
+                empty are skipped.
+            factory (callable): Called with no arguments to create each particle.
+
+        Returns:
+            list[BaseParticle]: The particles added, in the same order as their positions.
+        """
+        grid = self._sim_grid
+        get_chunk = self._get_chunk
+        active = self._active_particles
+        new = self._new_particles
+        dirty = self._dirty_cells
+        added = []
+        touched = {}
+        for pos in cells:
+            x, y = pos
+            if grid[y][x] is not None:
+                continue
+            p = factory()
+            grid[y][x] = p
+            p.pos = pos
+            p.sim = self
+            chunk = get_chunk(x, y)
+            chunk.particles[p] = None
+            counts = chunk.counts
+            counts[type(p)] = counts.get(type(p), 0) + 1
+            p.chunk = chunk
+            touched[chunk] = None
+            dirty[pos] = None
+            if p.active and p not in active:
+                active[p] = None
+                chunk.active_count += 1
+            new[p] = None
+            added.append(p)
+        self._particle_group.update(dict.fromkeys(added))
+        for chunk in touched:
+            chunk.changed = True
+            chunk.wake()
+        self._added += len(added)
+        self._layout_version += len(added)
+        if self._changes is not None:
+            for p in added:
+                self._changes.added(p)
+        return added
+
+    def remove_particles(self, region):
+        """Remove every particle inside a region.
+
+        This does the same thing as calling `remove_particle()` for each cell, but the particle
+        group and chunks are updated once for the whole batch.
+
+        Args:
+            region (pygame.Rect, Circle, Mask, list[list[bool]], numpy.ndarray): The cells to
+                clear. See `regions.region_cells()`.
+
+        Returns:
+            int: The number of particles removed.
+        """
+        grid = self._sim_grid
+        dirty = self._dirty_cells
+        removed = []
+        touched = {}
+        for pos in region_cells(region, (self._sim_size.x, self._sim_size.y)):
+            x, y = pos
+            p = grid[y][x]
+            if p is None:
+                continue
+            # wake up the particles waiting on this one before it's gone
+            p.activate()
+            self._drop_active(p)
+            self._forget(p)
+            self._new_particles.pop(p, None)
+            chunk = p.chunk
+            del chunk.particles[p]
+            counts = chunk.counts
+            counts[type(p)] -= 1
+            if not counts[type(p)]:
+                del counts[type(p)]
+            p.chunk = None
+            touched[chunk] = None
+            p.sim = None
+            grid[y][x] = None
+            dirty[pos] = None
+            removed.append(p)
+        group = self._particle_group
+        for p in removed:
+            group.pop(p, None)
+        for chunk in touched:
+            chunk.changed = True
+            chunk.wake()
+        for p in removed:
+            if self._changes is not None:
+                self._changes.removed(p, p.pos)
+            self._recycle(p)
+        self._removed += len(removed)
+        self._layout_version += len(removed)
+        return len(removed)
+
+    def track_changes(self):
+        """Start recording the changes made to the grid, for `pop_changes()`.
+
+        Every particle already in the simulation is reported as added in the first delta, so a
+        change stream that starts here can be replayed from an empty grid. Does nothing if
+        changes are already being recorded.
+        """
+        if self._changes is not None:
+            return
+        self._changes = ChangeTracker(self._sim_size.x)
+        for p in self._particle_group:
+            self._changes.added(p)
+
+    def pop_changes(self):
+        """Get the changes made to the grid since this was last called, or since
+        `track_changes()` was called.
+
+        Returns:
+            Delta: The net moves, additions, and removals. See `pyparticles.engine.changes`.
+        """
+        if self._changes is None:
+            raise RuntimeError('Changes aren\'t being recorded, call track_changes() first')
+        return self._changes.pop(self.stats.steps)
+
+    def iter_changes(self, steps=None, **kwargs):
+        """Step the simulation, yielding the changes made to the grid after each step.
+
+        Nothing is drawn, so this is meant for running simulations headlessly. Changes are
+        recorded from the first call on, and edits made between steps are included in the next
+        delta. Pass the deltas to a `ChangeWriter` to stream them somewhere else.
+
+        Args:
+            steps (int): Number of steps to run. Defaults to None, which runs forever.
+            **kwargs (any): Variable length list of keyword arguments. These arguments will be
+                passed into each particle's `update()` function.
+
+        Yields:
+            Delta: The changes made since the previous delta.
+        """
+        self.track_changes()
+        count = 0
+        while steps is None or count < steps:
+            self.step(**kwargs)
+            count += 1
+            yield self.pop_changes()
+
+    def save(self, path):
+        """Save the simulation to a snapshot file.
+
+        The snapshot holds the grid size, the species of each cell, each particle's active and
+        stuck state, and the dependency edges between particles. See `pyparticles.engine.snapshot`
+        for the file format.
+
+        Args:
+            path (str): Path of the file to write.
+
+        Raises:
+            ValueError: If a species was built with an argument that can't be stored in the
+                snapshot. See `snapshot.species_record()`.
+        """
+        species = {}
+        records = []
+        flags = array('B')
+        particles = {}
+        width = self._sim_size.x
+        if self._sparse:
+            cells = None
+        else:
+            cells = array('H', bytes(2 * width * self._sim_size.y))
+        for y, row in enumerate(self._sim_grid):
+            # sparse rows only hold their particles, keyed by x
+            for x, p in sorted(row.items()) if self._sparse else enumerate(row):
+                if p is not None:
+                    species_id = species.get(p.species)
+                    if species_id is None:
+                        species_id = species[p.species] = len(species) + 1
+                        records.append(snapshot.species_record(type(p), p.species.kwargs))
+                    if cells is not None:
+                        cells[y * width + x] = species_id
+                    particles[p] = len(particles)
+                    flags.append(snapshot.FLAG_ACTIVE * p.active
+                        | snapshot.FLAG_STUCK * getattr(p, 'stuck', False))
+        if cells is None:
+            # only build one row of cells at a time, rather than the whole grid
+            cells = self._sparse_snapshot_rows(species)
+        edges = array('I')
+        for p, d_index in particles.items():
+            for x, y in self._waiting_on.get(p, ()):
+                q = self._sim_grid[y][x]
+                if q is not None:
+                    edges.append(particles[q])
+                    edges.append(d_index)
+        snapshot.write_snapshot(path, (self._sim_size.x, self._sim_size.y),
+            records, cells, flags, edges)
+
+    def _sparse_snapshot_rows(self, species):
+        """Get the cells of a sparse simulation's snapshot one row at a time.
+
+        Args:
+            species (dict[Species, int]): Number of each species.
+
+        Yields:
+            array.array: Species of each cell in the next row, with typecode `'H'`.
+        """
+        empty = array('H', bytes(2 * self._sim_size.x))
+        for row in self._sim_grid:
+            if not row:
+                yield empty
+                continue
+            cells = array('H', empty)
+            for x, p in row.items():
+                cells[x] = species[p.species]
+            yield cells
+
+    @classmethod
+    def load(cls, path, cell_size, bg_img=None, bg_clr=None, chunk_size=8, seed=None,
+        render='sprites', sparse=False):
+        """Create a simulation from a snapshot file written by `save()`.
+
+        The snapshot is memory-mapped, and empty rows of it are skipped without being unpacked.
+        The particles are added in a batch per species, the same way as `add_particles()`. Each
+        particle is created by calling its class with the keyword arguments its species was built
+        with, and an `rng` keyword argument set to the new simulation's `rng`. Loaded particles
+        are updated on the first step, unlike particles added with `add_particle()`.
+
+        Args:
+            path (str): Path of the file to read.
+            cell_size (tuple): Pixel size of each grid cell.
+            bg_img (pygame.Surface): Background image for the simulation. Defaults to None.
+            bg_clr (pygame.Color): Background color for the simulation. Defaults to None.
+            chunk_size (int): Size of smallest map chunks to use for optimization. Defaults to 8.
+            seed (int): Seed for the random draws made by particles. Defaults to None.
+            render (str): How particles are drawn, one of `RENDER_MODES`. Defaults to
+                `'sprites'`.
+            sparse (bool): Whether or not to only allocate storage for the occupied part of the
+                grid. Defaults to False.
+
+        Returns:
+            ParticleSim: The loaded simulation.
+        """
+        with snapshot.Snapshot(path) as snap:
+            sim = cls(snap.size, cell_size, bg_img, bg_clr, chunk_size, seed, render, sparse)
+            width = snap.size[0]
+            cell_species = snap.cells
+            indexes = snap.occupied()
+            # species of each particle, in the order of the occupied cells
+            species_ids = list(map(cell_species.__getitem__, indexes))
+            species_set = set(species_ids)
+            particles = [None] * len(indexes)
+            for species_id in species_set:
+                if len(species_set) == 1:
+                    numbers = range(len(indexes))
+                else:
+                    numbers = list(compress(range(len(indexes)),
+                        map(species_id.__eq__, species_ids)))
+                particle_type, kwargs = snapshot.load_species(snap.species[species_id - 1])
+                factory = partial(particle_type, rng=sim.rng, **kwargs)
+                positions = ((indexes[i] % width, indexes[i] // width) for i in numbers)
+                for i, p in zip(numbers, sim._add_batch(positions, factory)):
+                    particles[i] = p
+            # particles are added active and not stuck, so only the others need changing
+            for i in compress(range(len(particles)), map(snapshot.FLAG_ACTIVE.__ne__, snap.flags)):
+                p = particles[i]
+                p_flags = snap.flags[i]
+                if p_flags & snapshot.FLAG_STUCK:
+                    p.stuck = True
+                if not p_flags & snapshot.FLAG_ACTIVE:
+                    p.active = False
+                    sim._drop_active(p)
+            # every edge joins two loaded particles, so the waits can be filled in directly rather
+            # than checked one by one with `wait_on()`
+            waits = {}
+            edges = iter(snap.edges)
+            for index, d_index in zip(edges, edges):
+                cells = waits.get(d_index)
+                if cells is None:
+                    cells = waits[d_index] = []
+                cells.append(particles[index].pos)
+            waiting_on = sim._waiting_on
+            waiters = sim._waiters
+            for d_index, cells in waits.items():
+                p = particles[d_index]
+                waiting_on[p] = tuple(cells)
+                for pos in cells:
+                    cell_waiters = waiters.get(pos)
+                    if cell_waiters is None:
+                        cell_waiters = waiters[pos] = {}
+                    cell_waiters[p] = None
+        sim._new_particles.clear()
+        sim.redraw()
+        return sim
@@ -0,0 +1,253 @@
+"""Binary snapshot format for saving and loading simulations.
+
+A snapshot file is laid out as follows, with every number stored little-endian and every
+section starting on a 4 byte boundary:
+
+- Header: magic bytes `PPSM`, format version (uint16), padding (uint16), grid width and height
+  (uint32 each), and the number of species, particles, and dependency edges (uint32 each).
+- Species table: the import path of each species' particle class as `module:qualname`, followed
+  by the keyword arguments the species was built with as a JSON object. Both are stored as their
+  length in bytes (uint16) followed by their UTF-8 encoding.
+- Cells (uint16 per cell, row by row): 0 for an empty cell, otherwise the index of the cell's
+  species in the species table plus 1.
+- Particle flags (uint8 per particle): state bits of each particle, in the same order their
+  cells appear in the cell array.
+- Dependency edges (2 uint32s per edge): the index of a particle followed by the index of one of
+  its dependants, using the same particle order as the flags.
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from importlib import import_module
+from itertools import compress
+from pyparticles.engine.utils import Point
+
+_MAGIC = b'PPSM'
+_VERSION = 2
+_HEADER = struct.Struct('<4sHxxIIIII')
+_LENGTH = struct.Struct('<H')
+
+# bits of the particle flags
+FLAG_ACTIVE = 1
+FLAG_STUCK = 2
+
+def _padding(size):
+    return -size % 4
+
+def _as_little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+def species_path(particle_type):
+    """Get the path a particle class is stored under in a snapshot's species table.
+
+    Args:
+        particle_type (type): The particle class.
+
+    Returns:
+        str: The class's path, as `module:qualname`.
+    """
+    return f'{particle_type.__module__}:{particle_type.__qualname__}'
+
+def import_species(path):
+    """Import a particle class from its path in a snapshot's species table.
+
+    Args:
+        path (str): The class's path, as `module:qualname`.
+
+    Returns:
+        type: The particle class.
+    """
+    module_name, _, qualname = path.partition(':')
+    obj = import_module(module_name)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+def _encode_arg(value):
+    if isinstance(value, Point):
+        return [value.x, value.y]
+    if isinstance(value, (list, tuple)):
+        return [_encode_arg(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'key'):
+        # argument objects, like GravityArgs, take their attributes as keyword arguments
+        return {'class': species_path(type(value)),
+            'args': {k: _encode_arg(v) for k, v in vars(value).items()}}
+    raise ValueError(f"Species argument {value!r} can't be stored in a species table")
+
+def _decode_arg(value):
+    if isinstance(value, list):
+        return [_decode_arg(v) for v in value]
+    if isinstance(value, dict):
+        return import_species(value['class'])(
+            **{k: _decode_arg(v) for k, v in value['args'].items()})
+    return value
+
+def species_record(particle_type, kwargs):
+    """Get the entry a species is stored under in a snapshot's species table.
+
+    Args:
+        particle_type (type): The particle class of the species.
+        kwargs (dict): The keyword arguments the species was built with, as in `Species.kwargs`.
+
+    Returns:
+        tuple[str, str]: The class's path, as `module:qualname`, and the keyword arguments as a
+            JSON object.
+
+    Raises:
+        ValueError: If an argument isn't a number, string, Point, sequence, or argument object.
+    """
+    return (species_path(particle_type),
+        json.dumps({k: _encode_arg(v) for k, v in kwargs.items()}, separators=(',', ':')))
+
+def load_species(record):
+    """Get the particle class and keyword arguments of an entry in a snapshot's species table.
+
+    Args:
+        record (tuple[str, str]): The entry, as returned by `species_record()`.
+
+    Returns:
+        tuple[type, dict]: The particle class, and the keyword arguments to create particles of
+            the species with.
+    """
+    path, kwargs = record
+    return import_species(path), {k: _decode_arg(v) for k, v in json.loads(kwargs).items()}
+
+def write_snapshot(path, size, species, cells, flags, edges):
+    """Write a snapshot file.
+
+    Args:
+        path (str): Path of the file to write.
+        size (tuple[int, int]): Width and height of the grid.
+        species (list[tuple[str, str]]): The species table, as returned by `species_record()`.
+        cells (array.array, iterable[array.array]): Species of each cell, with typecode `'H'`.
+            Can also be given a part at a time as an iterable of arrays, such as one per row.
+        flags (array.array): State flags of each particle, with typecode `'B'`.
+        edges (array.array): Dependency edges, with typecode `'I'`.
+    """
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, size[0], size[1], len(species), len(flags),
+            len(edges) // 2))
+        written = 0
+        for record in species:
+            for text in record:
+                encoded = text.encode('utf-8')
+                f.write(_LENGTH.pack(len(encoded)))
+                f.write(encoded)
+                written += _LENGTH.size + len(encoded)
+        f.write(bytes(_padding(written)))
+        parts = [cells] if isinstance(cells, array) else cells
+        for section in (parts, [flags], [edges]):
+            written = 0
+            for values in section:
+                values = _as_little_endian(values)
+                f.write(values)
+                written += len(values) * values.itemsize
+            f.write(bytes(_padding(written)))
+
+class Snapshot():
+    """A snapshot file opened for reading.
+
+    The file is memory-mapped rather than read, so the cell, flag, and edge arrays are views
+    straight into the file and nothing is parsed until it's used. The arrays can't be used after
+    `close()` is called. Snapshots can be used as context managers, which closes them on exit.
+
+    Args:
+        path (str): Path of the file to open.
+
+    Attributes:
+        size (tuple[int, int]): Width and height of the grid.
+        species (list[tuple[str, str]]): The species table, as entries accepted by
+            `load_species()`.
+        cells (memoryview): Species of each cell, row by row.
+        flags (memoryview): State flags of each particle.
+        edges (memoryview): Dependency edges, as consecutive pairs of particle indexes.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._view) < _HEADER.size:
+            raise ValueError('Snapshot file is truncated')
+        magic, version, width, height, n_species, n_particles, n_edges = \
+            _HEADER.unpack_from(self._view)
+        if magic != _MAGIC:
+            raise ValueError('File is not a simulation snapshot')
+        if version != _VERSION:
+            raise ValueError(f'Unsupported snapshot version {version}')
+        self.size = (width, height)
+        offset = _HEADER.size
+        self.species = []
+        for _ in range(n_species):
+            record = []
+            for _ in range(2):
+                length, = _LENGTH.unpack_from(self._view, offset)
+                offset += _LENGTH.size
+                record.append(bytes(self._view[offset:offset + length]).decode('utf-8'))
+                offset += length
+            self.species.append(tuple(record))
+        offset += _padding(offset)
+        self.cells, offset = self._section(offset, width * height, 'H')
+        self.flags, offset = self._section(offset, n_particles, 'B')
+        self.edges, offset = self._section(offset, 2 * n_edges, 'I')
+
+    def _section(self, offset, count, typecode):
+        nbytes = count * array(typecode).itemsize
+        if offset + nbytes > len(self._view):
+            raise ValueError('Snapshot file is truncated')
+        view = self._view[offset:offset + nbytes].cast(typecode)
+        if sys.byteorder != 'little':
+            # the file can't be used in place, so fall back to a swapped copy
+            view = array(typecode, view)
+            view.byteswap()
+        return view, offset + nbytes + _padding(nbytes)
+
+    def occupied(self):
+        """Find the cells that hold a particle.
+
+        Rows are compared against an empty row as raw bytes, and only the rows that aren't empty
+        are scanned cell by cell, so mostly empty grids are quick to scan.
+
+        Returns:
+            array.array: Index of each cell that holds a particle, in the same order as the
+                particle flags, with typecode `'I'`.
+        """
+        width, height = self.size
+        cells = self.cells
+        empty = bytes(2 * width)
+        indexes = array('I')
+        for start in range(0, width * height, width):
+            row = cells[start:start + width]
+            if row.tobytes() != empty:
+                indexes.extend(compress(range(start, start + width), row))
+        return indexes
+
+    def close(self):
+        """Release the arrays and unmap the file."""
+        for name in ('cells', 'flags', 'edges'):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+            setattr(self, name, None)
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
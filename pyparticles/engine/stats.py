@@ -0,0 +1,155 @@
+import cProfile
+import pstats
+import time
+from collections import deque
+
+# fields of each step's record, in the order they're reported
+TIMINGS = ('scan_time', 'update_time', 'draw_time')
+COUNTERS = ('active', 'moves', 'wakeups', 'deactivations', 'added', 'removed')
+
+class SimStats():
+    """Timings and counters of a simulation's recent steps.
+
+    The simulation fills in a record for every step: the time spent scanning for what to update
+    (building the update list and putting idle chunks to sleep), updating particles, and drawing,
+    plus the number of active particles at the end of the step and the number of moves,
+    wake-ups, deactivations, additions, and removals since the previous step ended. Particles
+    added or removed between steps are counted towards the next step. Times are in seconds.
+
+    The last `window` records are kept for rolling averages. Profiling with cProfile and
+    callbacks can be attached to a number of upcoming steps, and cost nothing when unused.
+
+    Args:
+        window (int): Number of recent steps to keep records for. Defaults to 60.
+
+    Attributes:
+        steps (int): Number of steps recorded so far.
+        last (dict): Record of the most recent step, or None if no steps have been recorded.
+        records (collections.deque[dict]): Records of the most recent steps, oldest first.
+        last_profile (pstats.Stats): Result of the most recent `profile()` window that finished
+            without a callback, or None.
+    """
+
+    def __init__(self, window=60):
+        self.steps = 0
+        self.last = None
+        self.records = deque(maxlen=window)
+        self.last_profile = None
+        self._profiler = None
+        self._profile_steps = 0
+        self._profile_callback = None
+        self._callbacks = []
+
+    def begin_step(self):
+        """Mark the start of a step. Called by the simulation.
+
+        Returns:
+            float: The time the step started, from `time.perf_counter()`.
+        """
+        if self._profile_steps:
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return time.perf_counter()
+
+    def end_step(self, scan_time, update_time, counters):
+        """Record a finished step and run any attached profiling and callbacks. Called by the
+        simulation.
+
+        Args:
+            scan_time (float): Seconds spent scanning for what to update.
+            update_time (float): Seconds spent updating particles.
+            counters (dict[str, int]): Value of each counter in `COUNTERS` for the step.
+        """
+        record = dict(counters)
+        record['scan_time'] = scan_time
+        record['update_time'] = update_time
+        record['draw_time'] = 0.0
+        self.records.append(record)
+        self.last = record
+        self.steps += 1
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profile_steps -= 1
+            if self._profile_steps <= 0:
+                self._finish_profile()
+        if self._callbacks:
+            for entry in list(self._callbacks):
+                entry[0](self)
+                if entry[1] is not None:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        self._callbacks.remove(entry)
+
+    def add_draw_time(self, draw_time):
+        """Add drawing time to the most recent step's record. Called by the simulation.
+
+        Args:
+            draw_time (float): Seconds spent drawing.
+        """
+        if self.last is not None:
+            self.last['draw_time'] += draw_time
+
+    def averages(self):
+        """Get the average of every field over the recorded steps.
+
+        Returns:
+            dict: The average of each timing and counter, or an empty dict if no steps have been
+                recorded.
+        """
+        if not self.records:
+            return {}
+        n = len(self.records)
+        return {key: sum(r[key] for r in self.records) / n for key in TIMINGS + COUNTERS}
+
+    def profile(self, steps, callback=None):
+        """Profile the next few steps with cProfile.
+
+        Only the time spent inside `step()` is profiled. Calling this while a profile is already
+        running restarts the window.
+
+        Args:
+            steps (int): Number of steps to profile.
+            callback (callable): Called with the `pstats.Stats` of the profile once it's done.
+                Defaults to None, which stores them in `last_profile` instead.
+        """
+        self._profiler = None
+        self._profile_steps = steps
+        self._profile_callback = callback
+
+    def add_callback(self, callback, steps=None):
+        """Call a function after each of the next few steps.
+
+        Args:
+            callback (callable): Called with this object after each step is recorded.
+            steps (int): Number of steps to call it for. Defaults to None, which calls it after
+                every step until it's removed with `remove_callback()`.
+        """
+        self._callbacks.append([callback, steps])
+
+    def remove_callback(self, callback):
+        self._callbacks = [entry for entry in self._callbacks if entry[0] is not callback]
+
+    def _finish_profile(self):
+        stats = pstats.Stats(self._profiler)
+        self._profiler = None
+        self._profile_steps = 0
+        callback = self._profile_callback
+        self._profile_callback = None
+        if callback is not None:
+            callback(stats)
+        else:
+            self.last_profile = stats
+
+    def summary(self):
+        """Get a one line summary of the rolling averages.
+
+        Returns:
+            str: Average timings in milliseconds and average counters.
+        """
+        avg = self.averages()
+        if not avg:
+            return 'no steps recorded'
+        times = ', '.join(f'{key[:-5]} {1000 * avg[key]:.2f} ms' for key in TIMINGS)
+        counts = ', '.join(f'{key} {avg[key]:.1f}' for key in COUNTERS)
+        return f'{times} | {counts}'
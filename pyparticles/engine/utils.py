@@ -1,100 +1,164 @@
+import sys
+from importlib import import_module
 from random import choice
-from pygame import Vector2
 
-def rand_iter(vals):
+class _LazyModule():
+    """Stand-in for a module that imports it the first time one of its attributes is used.
+
+    Attributes are copied onto the stand-in as they're used, so later lookups are as fast as
+    lookups on the module itself.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(import_module(self._name), attr)
+        setattr(self, attr, value)
+        return value
+
+def lazy_import(name):
+    """Get a module that's only imported once it's used.
+
+    This keeps heavy dependencies that are only needed for drawing, like pygame, from being
+    imported by code that never draws anything, such as headless simulations.
+
+    Args:
+        name (str): Full name of the module.
+
+    Returns:
+        any: A stand-in for the module. Using any of its attributes imports the module, raising
+            ImportError if it isn't installed.
+    """
+    return _LazyModule(name)
+
+def rand_iter(vals, rng=None):
     """Iterate over a list (or other iterable) in a random order
 
     Args:
         vals (iterable): The item to iterate over in a random order
+        rng (SimRandom): Generator to draw the order from. Defaults to None, which uses the
+            global `random` module.
 
     Yields:
         any: The next item in the random iteration
     """
+    if rng is not None:
+        for i in rng.permutation(len(vals)):
+            yield vals[i]
+        return
     temp = vals[:]
     while len(temp) > 0:
         ret = choice(temp)
         temp.remove(ret)
         yield ret
 
+def as_xy(pos):
+    """Get the x and y values of a Point or Point-like value without creating a new Point.
+
+    Tuples are returned as-is, so hot code paths should pass positions around as `(x, y)` tuples
+    of ints.
+
+    Args:
+        pos (Point, Point-like): The position to unpack.
+
+    Returns:
+        tuple[int, int]: The x and y values of `pos`.
+    """
+    if type(pos) is tuple:
+        return pos
+    if type(pos) is Point:
+        return (pos.x, pos.y)
+    if isinstance(pos, list):
+        return (pos[0], pos[1])
+    # Vector2s can only exist if pygame was already imported, so don't import it to check
+    pygame = sys.modules.get('pygame')
+    if pygame is not None and isinstance(pos, pygame.Vector2):
+        return (int(pos.x), int(pos.y))
+    raise ValueError(f'Expected Point, tuple, list, or Vector2, but got {pos}')
+
 class Point():
+    """Mutable 2D integer point.
+
+    Operators accept other Points or Point-like values (tuples, lists, and Vector2s). They never
+    convert the other value into a temporary Point, so the only Points created are the results
+    of operators that return a new Point.
+
+    Args:
+        x_val (int, Point, Point-like): The x value, or the entire point if `y_val` isn't given.
+        y_val (int): The y value. Defaults to None.
+    """
+
+    __slots__ = ('x', 'y')
+
     def __init__(self, x_val, y_val=None):
-        self.x = 0
-        self.y = 0
         if y_val is None:
-            if isinstance(x_val, Point):
-                self.x = x_val.x
-                self.y = x_val.y
-            elif isinstance(x_val, (list, tuple)):
-                self.x, self.y = x_val
-            elif isinstance(x_val, Vector2):
-                self.x = int(x_val.x)
-                self.y = int(x_val.y)
-            else:
-                raise ValueError(f'Expected tuple, list, or Vector2, but got {x_val}')
+            self.x, self.y = as_xy(x_val)
         else:
             self.x = int(x_val)
             self.y = int(y_val)
 
     def __add__(self, other):
-        other = Point(other)
-        return Point(self.x + other.x, self.y + other.y)
+        ox, oy = as_xy(other)
+        return Point(self.x + ox, self.y + oy)
 
     def __iadd__(self, other):
-        other = Point(other)
-        self.x += other.x
-        self.y += other.y
+        ox, oy = as_xy(other)
+        self.x += ox
+        self.y += oy
         return self
 
     def __sub__(self, other):
-        other = Point(other)
-        return Point(self.x - other.x, self.y - other.y)
+        ox, oy = as_xy(other)
+        return Point(self.x - ox, self.y - oy)
 
     def __isub__(self, other):
-        other = Point(other)
-        self.x -= other.x
-        self.y -= other.y
+        ox, oy = as_xy(other)
+        self.x -= ox
+        self.y -= oy
         return self
 
     def __eq__(self, other):
-        other = Point(other)
-        return self.x == other.x and self.y == other.y
+        ox, oy = as_xy(other)
+        return self.x == ox and self.y == oy
 
     def __lt__(self, other):
-        other = Point(other)
-        return self.x < other.x and self.y < other.y
+        ox, oy = as_xy(other)
+        return self.x < ox and self.y < oy
 
     def __gt__(self, other):
-        other = Point(other)
-        return self.x > other.x and self.y > other.y
+        ox, oy = as_xy(other)
+        return self.x > ox and self.y > oy
 
     def __le__(self, other):
-        other = Point(other)
-        return self.x <= other.x and self.y <= other.y
+        ox, oy = as_xy(other)
+        return self.x <= ox and self.y <= oy
 
     def __ge__(self, other):
-        other = Point(other)
-        return self.x >= other.x and self.y >= other.y
+        ox, oy = as_xy(other)
+        return self.x >= ox and self.y >= oy
 
     def __iter__(self):
-        yield self.x
-        yield self.y
+        return iter((self.x, self.y))
 
     def clamp(self, min_point, max_point, exclude_min=False, exclude_max=True):
-        min_point = Point(min_point)
+        min_x, min_y = as_xy(min_point)
         if exclude_min:
-            min_point += (1, 1)
-        max_point = Point(max_point)
+            min_x += 1
+            min_y += 1
+        max_x, max_y = as_xy(max_point)
         if exclude_max:
-            max_point -= (1, 1)
-        clamped_point = Point(self)
-        if clamped_point.x <= min_point.x:
-            clamped_point.x = min_point.x
-        elif clamped_point.x >= max_point.x:
-            clamped_point.x = max_point.x
-        if clamped_point.y <= min_point.y:
-            clamped_point.y = min_point.y
-        elif clamped_point.y >= max_point.y:
-            clamped_point.y = max_point.y
+            max_x -= 1
+            max_y -= 1
+        clamped_point = Point(self.x, self.y)
+        if clamped_point.x <= min_x:
+            clamped_point.x = min_x
+        elif clamped_point.x >= max_x:
+            clamped_point.x = max_x
+        if clamped_point.y <= min_y:
+            clamped_point.y = min_y
+        elif clamped_point.y >= max_y:
+            clamped_point.y = max_y
         return clamped_point
 
     def clamp_self(self, min_point, max_point, exclude_min=False, exclude_max=True):
@@ -104,4 +168,4 @@ class Point():
 
     def get_normalized(self):
         # TODO: implement a probabilistic version of this
-        return Point(self.x // abs(self.x), self.y // abs(self.y))
\ No newline at end of file
+        return Point(self.x // abs(self.x), self.y // abs(self.y))
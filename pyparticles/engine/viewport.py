@@ -0,0 +1,211 @@
+from math import floor
+import pygame
+from pyparticles.engine.utils import Point, as_xy
+
+# most scaled tiles kept in the cache before tiles that aren't visible are dropped
+_MAX_TILES = 512
+
+class Viewport():
+    """Pan/zoom view of a simulation's image.
+
+    The image is split into square tiles, and each tile is scaled to the current zoom once, then
+    kept in a cache until the area of the image it covers is redrawn or the zoom changes. Only the
+    tiles that overlap the visible window are scaled and drawn, so the cost of drawing depends on
+    the size of the window rather than the size of the simulation.
+
+    Redrawn areas of the image must be passed to `invalidate()`, usually straight from the
+    simulation's `pop_dirty_rects()` or a `SimRunner` frame, so the tiles covering them are scaled
+    again. `visible_cells()` gives the grid area that's visible, which can be used as a
+    `ParticleSim`'s `view` so cells outside the window aren't redrawn either.
+
+    Args:
+        sim (BaseSim): The simulation to view.
+        size (tuple[int, int]): Pixel size of the window the view is drawn into.
+        tile_size (int): Pixel size of each tile of the simulation's image, at 1x zoom. Defaults
+            to 128.
+        min_zoom (float): Smallest zoom allowed. Defaults to 0.25.
+        max_zoom (float): Largest zoom allowed. Defaults to 8.0.
+
+    Attributes:
+        size (Point): Pixel size of the window the view is drawn into.
+        offset (tuple[float, float]): Pixel position of the simulation's image, at 1x zoom, shown
+            at the top left of the window.
+        zoom (float): Scale the simulation's image is drawn at.
+    """
+
+    def __init__(self, sim, size, tile_size=128, min_zoom=0.25, max_zoom=8.0):
+        self.size = Point(size)
+        self.offset = (0.0, 0.0)
+        self.zoom = 1.0
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._sim = sim
+        self._image_rect = sim.get_image_rect()
+        self._cell_width, self._cell_height = sim.get_cell_rect((0, 0)).size
+        self._tile_size = tile_size
+        # scaled tiles keyed by tile position, all at `_cache_zoom`
+        self._tiles = {}
+        self._cache_zoom = None
+        # view the window was last drawn with, so unchanged views only redraw new tiles
+        self._drawn_view = None
+
+    def pan(self, dx, dy):
+        """Move the view by a number of window pixels.
+
+        Args:
+            dx (float): Pixels to move right by.
+            dy (float): Pixels to move down by.
+        """
+        x, y = self.offset
+        self.offset = (x + dx / self.zoom, y + dy / self.zoom)
+
+    def zoom_at(self, factor, pos):
+        """Multiply the zoom by a factor, keeping the point under a window position in place.
+
+        The zoom is clamped between `min_zoom` and `max_zoom`.
+
+        Args:
+            factor (float): Factor to multiply the zoom by.
+            pos (Point, Point-like): Window position to zoom around, such as the mouse position.
+        """
+        x, y = as_xy(pos)
+        zoom = min(self.max_zoom, max(self.min_zoom, self.zoom * factor))
+        ox, oy = self.offset
+        self.offset = (ox + x / self.zoom - x / zoom, oy + y / self.zoom - y / zoom)
+        self.zoom = zoom
+
+    def get_abs_pos(self, pos):
+        """Get the pixel position in the simulation's image, at 1x zoom, under a window position.
+
+        Args:
+            pos (Point, Point-like): The window position.
+
+        Returns:
+            Point: The pixel position in the simulation's image.
+        """
+        x, y = as_xy(pos)
+        ox, oy = self.offset
+        return Point(floor(ox + x / self.zoom), floor(oy + y / self.zoom))
+
+    def get_pos(self, pos):
+        """Get the grid position under a window position.
+
+        Args:
+            pos (Point, Point-like): The window position.
+
+        Returns:
+            Point: The grid position, which may be out of bounds.
+        """
+        x, y = self.get_abs_pos(pos)
+        return Point(x // self._cell_width, y // self._cell_height)
+
+    def visible_area(self):
+        """Get the area of the simulation's image, at 1x zoom, that's visible in the window.
+
+        Returns:
+            pygame.Rect: The visible pixel area, clipped to the image.
+        """
+        left, top = self.get_abs_pos((0, 0))
+        right, bottom = self.get_abs_pos(self.size)
+        return pygame.Rect(left, top, right - left + 1, bottom - top + 1).clip(self._image_rect)
+
+    def visible_cells(self):
+        """Get the grid area that's visible in the window.
+
+        Returns:
+            pygame.Rect: The visible grid area, including partly visible cells.
+        """
+        area = self.visible_area()
+        left, top = area.left // self._cell_width, area.top // self._cell_height
+        return pygame.Rect(left, top,
+            -(-area.right // self._cell_width) - left,
+            -(-area.bottom // self._cell_height) - top)
+
+    def invalidate(self, rects):
+        """Drop the cached tiles covering areas of the simulation's image that were redrawn.
+
+        Args:
+            rects (list[pygame.Rect]): The redrawn pixel areas of the image.
+        """
+        if not self._tiles:
+            return
+        size = self._tile_size
+        for r in rects:
+            if r.width <= 0 or r.height <= 0:
+                continue
+            for ty in range(r.top // size, (r.bottom - 1) // size + 1):
+                for tx in range(r.left // size, (r.right - 1) // size + 1):
+                    self._tiles.pop((tx, ty), None)
+
+    def _tile_edge(self, pixel):
+        """Get the scaled position of a pixel edge of the image, so neighbouring tiles meet up
+        without gaps or overlaps.
+        """
+        return floor(pixel * self.zoom)
+
+    def draw(self, surface, image=None, dest=(0, 0)):
+        """Draw the visible part of the simulation's image onto a surface.
+
+        If the view hasn't changed since the last call, only the tiles that were scaled again are
+        drawn, and the rest of the window is left as it was.
+
+        Args:
+            surface (pygame.Surface): The surface to draw onto, such as the screen.
+            image (pygame.Surface): A copy of the simulation's image to draw, such as a
+                `SimRunner` frame. Defaults to None, which reads the simulation itself with
+                `get_area()`.
+            dest (Point, Point-like): Position of the top left of the window on the surface.
+                Defaults to (0, 0).
+
+        Returns:
+            list[pygame.Rect]: The areas of the surface that were drawn on.
+        """
+        dest = as_xy(dest)
+        if self._cache_zoom != self.zoom:
+            self._tiles.clear()
+            self._cache_zoom = self.zoom
+        window = pygame.Rect(dest, (self.size.x, self.size.y))
+        view = (self.offset, self.zoom, id(surface), dest)
+        full = view != self._drawn_view
+        self._drawn_view = view
+        # position of the image's top left on the surface
+        origin_x = dest[0] - self._tile_edge(self.offset[0])
+        origin_y = dest[1] - self._tile_edge(self.offset[1])
+        area = self.visible_area()
+        size = self._tile_size
+        visible = []
+        drawn = []
+        blits = []
+        for ty in range(area.top // size, (area.bottom - 1) // size + 1):
+            for tx in range(area.left // size, (area.right - 1) // size + 1):
+                key = (tx, ty)
+                visible.append(key)
+                tile = self._tiles.get(key)
+                if tile is not None and not full:
+                    continue
+                left, top = self._tile_edge(tx * size), self._tile_edge(ty * size)
+                if tile is None:
+                    tile_rect = pygame.Rect(tx * size, ty * size, size, size).clip(
+                        self._image_rect)
+                    if image is not None:
+                        source = image.subsurface(tile_rect)
+                    else:
+                        source = self._sim.get_area(tile_rect)
+                    tile = pygame.transform.scale(source,
+                        (self._tile_edge(tile_rect.right) - left,
+                        self._tile_edge(tile_rect.bottom) - top))
+                    self._tiles[key] = tile
+                pos = (origin_x + left, origin_y + top)
+                blits.append((tile, pos))
+                drawn.append(pygame.Rect(pos, tile.get_size()).clip(window))
+        if full:
+            # clear the parts of the window the image doesn't cover
+            surface.fill('black', window)
+            drawn = [window]
+        clip = surface.get_clip()
+        surface.set_clip(window)
+        surface.blits(blits, doreturn=False)
+        surface.set_clip(clip)
+        if len(self._tiles) > _MAX_TILES:
+            self._tiles = {key: self._tiles[key] for key in visible if key in self._tiles}
+        return drawn
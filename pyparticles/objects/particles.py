@@ -1,19 +1,35 @@
-import pygame
-from random import randint
+import random
+from pyparticles.engine.utils import lazy_import
 from pyparticles.objects import properties
 
-_SPRITE_SHEET = pygame.Surface((20, 20))
-_sprite_rect = pygame.Rect(0, 0, 10, 10)
-_SPRITE_SHEET.fill('sienna', _sprite_rect)
-_sprite_rect.topleft = (0, 10)
-_SPRITE_SHEET.fill('sienna1', _sprite_rect)
-_sprite_rect.topleft = (10, 0)
-_SPRITE_SHEET.fill('sienna2', _sprite_rect)
-_sprite_rect.topleft = (10, 10)
-_SPRITE_SHEET.fill('sienna3', _sprite_rect)
-_SPRITES = [[
-    _SPRITE_SHEET.subsurface(pygame.Rect(x*10, y*10, 10, 10))
-    for x in range(2)] for y in range(2)]
+pygame = lazy_import('pygame')
+
+class _ColorSprites():
+    """`image` of particles that are drawn as one of their class's `colors`.
+
+    Each particle picks a color when it's created and keeps its index in `variant`. The sprites
+    of a class are solid 10x10 squares, only built the first time a particle of that class is
+    drawn, so particles can be created and simulated without importing pygame. A particle's
+    sprite is stored on it the first time it's read.
+    """
+
+    def __init__(self):
+        # sprites of each particle class, in the same order as its colors
+        self._sprites = {}
+
+    def __get__(self, particle, particle_type):
+        if particle is None:
+            return self
+        sprites = self._sprites.get(particle_type)
+        if sprites is None:
+            sprites = self._sprites[particle_type] = []
+            for color in particle_type.colors:
+                sprite = pygame.Surface((10, 10))
+                sprite.fill(color)
+                sprites.append(sprite)
+        # keep the sprite on the particle, so later reads don't come back here
+        image = particle.image = sprites[particle.variant]
+        return image
 
 class TestParticle(
     properties.HeapableParticle,
@@ -22,21 +38,72 @@ class TestParticle(
     """Test particle
 
     TODO: replace with actual particle later
+
+    Args:
+        **kwargs: Variable length list of keyword arguments. The following keyword arguments are
+            recognized:\n
+            - rng (SimRandom, random.Random): Generator used to pick the particle's sprite.
+                Defaults to the global `random` module.
+
+    Attributes:
+        variant (int): Index of the particle's color in `colors`.
     """
 
+    # colors of each sprite, used by engines that draw cells without sprites
+    colors = ('sienna', 'sienna1', 'sienna2', 'sienna3')
+    image = _ColorSprites()
+    # fall first, and only try to form a heap if that fails
+    behaviours = (properties.GravityParticle, properties.HeapableParticle)
+
     def __init__(self, **kwargs):
-        super().__init__(
-            **kwargs,
+        super().__init__(**kwargs)
+        rng = kwargs.get('rng', random)
+        self.variant = rng.randrange(2) + 2 * rng.randrange(2)
+
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        # the parameters are given here rather than in `__init__()`, so particles created without
+        # any keyword arguments of their own can skip straight to the shared species
+        params = dict(
             gravity_vec = (0, 1),
             heap_vec = [(1,1), (-1,1)],
             heap_prob = 0.5,
             heap_limit = [(1,2),(-1,2)]
         )
-        self.image = _SPRITES[randint(0, 1)][randint(0, 1)]
-        self.rect = _sprite_rect.copy()
-
-    def update(self, **kwargs):
-        self.pre_update()
-        properties.GravityParticle.update(self, **kwargs)
-        properties.HeapableParticle.update(self, **kwargs)
-        properties.BaseParticle.update(self, **kwargs)
\ No newline at end of file
+        params.update(kwargs)
+        super().init_species(species, **params)
+
+class TestLiquidParticle(
+    properties.LiquidParticle,
+    properties.GravityParticle,
+    properties.BaseParticle):
+    """Test liquid particle
+
+    Args:
+        **kwargs: Variable length list of keyword arguments. The following keyword arguments are
+            recognized:\n
+            - rng (SimRandom, random.Random): Generator used to pick the particle's sprite.
+                Defaults to the global `random` module.
+
+    Attributes:
+        variant (int): Index of the particle's color in `colors`.
+    """
+
+    colors = ('royalblue', 'royalblue1', 'royalblue2', 'royalblue3')
+    image = _ColorSprites()
+    # fall first, and only flow sideways if that fails
+    behaviours = (properties.GravityParticle, properties.LiquidParticle)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        rng = kwargs.get('rng', random)
+        self.variant = rng.randrange(2) + 2 * rng.randrange(2)
+
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        params = dict(
+            gravity_vec = (0, 1),
+            liquid_rate = 5
+        )
+        params.update(kwargs)
+        super().init_species(species, **params)
@@ -1,18 +1,12 @@
-from random import random
-import pygame
-from pyparticles.engine. utils import Point, rand_iter
-
-# TODO: add chained physics resolution, meaning particles will call `update()` on other
-# update-able particles that are blocking thier movement. This will allow for cool things,
-# such as entire piles of gravtity-affected particles falling at once or fluids flowing
-# more smoothly. However, this will be difficult since we need to track which particles
-# have been called in the resolution chain to prevent infinite loops and repeat work,
-# but this tracking value must also be reset after each chain resolves
-
-class BaseParticle(pygame.sprite.Sprite):
+from pyparticles.engine. utils import Point
+from pyparticles.objects.species import get_species
+
+class BaseParticle():
     """Base class for all other particles.
 
-    Subclasses must assign `image` and `rect` attributes for the sprites to render properly.
+    Subclasses must provide an `image` attribute for the particles to render properly. It's only
+    read when a particle is drawn, so it can be a property that builds images on demand, which
+    keeps particles (and simulations that never draw) from needing pygame at all.
 
     This is designed to work in a hybrid inheritence approach. The `__init__()` methods will
     work cooperatively, each calling `super().__init__()` to ensure a given particle initializes
@@ -20,51 +14,103 @@ class BaseParticle(pygame.sprite.Sprite):
     where none of the `update()` methods call `super().update()`. This allows a given particle
     type to control the order in which it executes specific behavior.
 
+    Instead of writing `update()` by hand, a particle class can list the properties to run, in
+    order, in a `behaviours` class attribute. When the class is defined, their `_behave()`
+    methods are compiled into a single `update()` for it, which resets the dirty bits, runs each
+    behaviour until one of them updates the particle, then deactivates the particle if nothing
+    could update it. This does the same thing as calling `pre_update()`, each property's
+    `update()`, then `BaseParticle.update()`, without unpacking keyword arguments and looking up
+    the simulation for every property.
+
+    Behaviour parameters that are the same for every particle of a kind (gravity, heap vectors,
+    and so on) aren't stored on each particle. Instead, properties fill them in on a shared
+    `Species` in their `init_species()` class methods, which also work cooperatively. The species
+    is built once per particle class and set of keyword arguments, and particles only store
+    their own mutable state.
+
     Args:
-        **kwargs (any): Variable length list of keyword arguments. The following keyword arguments
-            are recognized:\n
-            - groups (list): List of groups to add this sprite to. Defaults to None.
+        **kwargs (any): Variable length list of keyword arguments, which are passed on to
+            `init_species()` to build the particle's species.
 
     Attributes:
-        image (pygame.Surface): The image for this sprite.
-        rect (pygame.Rect): The rectangle corresponding to the location and size of this sprite.
+        image (pygame.Surface): The image for this particle, or None if it can't be drawn.
+        rect (pygame.Rect): The pixel area of the cell this particle is in, or None if it isn't
+            in a simulation. A new Rect is created each time this is read.
+        species (Species): The behaviour parameters this particle shares with others of its kind.
         updated (bool): Dirty bit for the sprite. If True, the sprite has been updated this frame.
         updateable (bool): Whether or not this particle can update itself, assuming all
             probabilistic behavior triggers.
-        dependants (list[BaseParticle]): Particles that can interact with this particle when active
         active (bool): active state of particle
+        chunk (Chunk): The simulation chunk this particle is in. Set by the simulation.
+        pos (tuple[int, int]): The grid position of this particle. Set by the simulation.
+        sim (ParticleSim): The simulation this particle is in. Set by the simulation.
     """
 
     # dirty: int
-    # image: pygame.Surface
-    # rect: pygame.Rect
+    image = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        behaviours = cls.__dict__.get('behaviours')
+        if behaviours is not None and 'update' not in cls.__dict__:
+            cls.update = _compile_update(cls, behaviours)
 
     def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            if key == 'groups':
-                pygame.sprite.Sprite.__init__(self, *value)
-                return
-        pygame.sprite.Sprite.__init__(self)
+        self.species = get_species(type(self), kwargs)
         # initialize attributes to default values
-        self.image = None
-        self.rect = None
+        self.reset()
+
+    def reset(self):
+        """Reset this particle's mutable state to how it was when the particle was created.
+
+        Simulations call this to recycle particles that were removed from them. Properties that
+        add mutable state must override this, call `super().reset()`, and reset their state.
+        This is also called by `__init__()`, once `species` is set.
+        """
         self.updated = True
         self._updateable = True
-        self._dependants = []
         self.active = True
-        # Vector list of particles this depends on to be activated. Values are set by the init
-        # functions of subclasses, and this list remains unchanged afterwards. If this particle
-        # fails to update and all the particles it depends on are deactivated, then this particle
-        # will deactivate.
-        self._depends_on = []
+        self.chunk = None
+        self.pos = None
+        self.sim = None
+
+    @classmethod
+    def species_for(cls, **kwargs):
+        """Get the species of particles of this class created with the given keyword arguments.
 
-    def add_dependant(self, particle):
-        self._dependants.append(particle)
+        Args:
+            **kwargs (any): The keyword arguments the particle would be created with.
+
+        Returns:
+            Species: The shared species.
+        """
+        return get_species(cls, kwargs)
+
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        """Fill in the behaviour parameters shared by every particle of a species.
+
+        Called once per species by `get_species()`, with the keyword arguments of the first
+        particle of the species. Properties that override this must call
+        `super().init_species()` first.
+
+        Args:
+            species (Species): The species to fill in.
+            **kwargs (any): The keyword arguments the particle was created with.
+        """
+
+    @property
+    def rect(self):
+        if self.sim is None:
+            return None
+        return self.sim.get_cell_rect(self.pos)
 
     def activate(self):
         self.active = True
-        while len(self._dependants) > 0:
-            self._dependants.pop().activate()
+        if self.sim is not None:
+            self.sim.register_active(self)
+            # wake up the particles waiting on this one
+            self.sim.wake_cell(self.pos)
         # TODO: some way to call update() to update particles on same frame they were activated on?
 
     def pre_update(self):
@@ -74,21 +120,38 @@ class BaseParticle(pygame.sprite.Sprite):
     def update(self, **kwargs):
         """Method to control sprite behavior.
 
-        Default method does nothing. To implement specific behavior, it must be overridden by
-        subclasses. These implementations should be prefaced by `if self.dirty != 0: pass` to
-        prevent the particle from being updated multiple times per frame.
+        Deactivates the particle if it wasn't updated and couldn't have been, so it waits on the
+        cells it depends on instead. Otherwise, wakes up the particles waiting on it. Particle
+        types should call this after all their other behaviour, or list their properties in
+        `behaviours` instead of writing `update()` themselves.
+        """
+        self._settle(kwargs['sim'])
+
+    def _settle(self, sim):
+        """Deactivate the particle if it couldn't update, otherwise wake up its waiters.
+
+        Args:
+            sim (ParticleSim): The simulation the particle is in.
         """
         if self.updated or self._updateable:
-            while len(self._dependants) > 0:
-                self._dependants.pop().activate()
+            sim.wake_cell(self.pos)
             return
-        sim = kwargs['sim']
-        pos = sim.get_pos(self.rect.topleft)
-        for d in self._depends_on:
-            p = sim.get_cell(pos + d)
-            if p is not None:
-                p.add_dependant(self)
+        # wait for any of the cells this particle depends on to change before updating again
+        sim.wait_on(self, self._wait_cells())
         self.active = False
+        sim.unregister_active(self)
+
+    def _wait_cells(self):
+        """Get the grid positions this particle waits on when it deactivates.
+
+        Defaults to the cells at the species' `depends_on` offsets. Properties that depend on
+        cells that can't be given as fixed offsets can override this to add them.
+
+        Returns:
+            list[tuple[int, int]]: The grid positions, which may be out of bounds.
+        """
+        x, y = self.pos
+        return [(x + d.x, y + d.y) for d in self.species.depends_on]
 
 class GravityArgs():
     def __init__(self, vec=(0,0), prob=1.0):
@@ -98,6 +161,9 @@ class GravityArgs():
     def copy(self):
         return GravityArgs(vec=self.vec, prob=self.prob)
 
+    def key(self):
+        return (self.vec.x, self.vec.y, self.prob)
+
 class GravityParticle(BaseParticle):
     """Particle with gravity (or any other kind of constant linear force)
 
@@ -108,39 +174,50 @@ class GravityParticle(BaseParticle):
                 of this particle's gravity.
             - gravity_vec (Point, Point-like): X,Y vector representing the force to be applied
                 to the particle. Defaults to (0, 0).
-            - gravity_prob (float): Probablity (from 0.0 to 1.0) that the particle will update due to
-                this property. Defaults to 1.0.
+            - gravity_prob (float): Probablity (from 0.0 to 1.0) that the particle will update due
+                to this property. Defaults to 1.0.
 
     Attributes:
-        gravity (GravityArgs): The gravity vector and probability of the particle.
+        gravity (GravityArgs): The gravity vector and probability of the particle. Shared by
+            every particle of the same species.
     """
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.gravity = GravityArgs()
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        super().init_species(species, **kwargs)
+        gravity = GravityArgs()
         for key, value in kwargs.items():
             if key == 'gravity':
-                self.gravity = value.copy()
+                gravity = value.copy()
             if key == 'gravity_vec':
-                self.gravity.vec = Point(value)
+                gravity.vec = Point(value)
             if key == 'gravity_prob':
-                self.gravity.prob = value
-        self._depends_on.append(self.gravity.vec)
+                gravity.prob = value
+        species.gravity = gravity
+        species.depends_on.append(gravity.vec)
+
+    @property
+    def gravity(self):
+        return self.species.gravity
 
     def update(self, **kwargs):
         if self.updated:
             return
-        sim = kwargs['sim']
+        GravityParticle._behave(self, kwargs['sim'], kwargs)
+
+    def _behave(self, sim, kwargs):
         # apply gravity and clamp the new position
-        dest_pos = sim.get_pos(self.rect.topleft) + self.gravity.vec
+        x, y = self.pos
+        gravity = self.species.gravity
+        vec = gravity.vec
+        dest_pos = (x + vec.x, y + vec.y)
         # we can't move because we're at the edge of the sim
         if not sim.in_bounds(dest_pos):
             return
-        # try to move to the new position
-        # TODO: chained physics resolution
-        dest_cell = sim.get_cell(dest_pos)
+        # try to move to the new position, updating whatever is in the way first
+        dest_cell = sim.resolve_cell(dest_pos, **kwargs)
         if dest_cell is None: # particle can move
-            if random() < self.gravity.prob:
+            if sim.rng.random() < gravity.prob:
                 sim.move_particle(self, dest_pos)
                 self.updated = True
             else: # particle failed random check, but could've moved
@@ -166,6 +243,9 @@ class HeapArgs():
     def copy(self):
         return HeapArgs(vecs=self.vecs, prob=self.prob, limits=self.limits, stuck=self.stuck)
 
+    def key(self):
+        return (tuple(self.vecs), self.prob, tuple(self.limits), self.stuck)
+
 class HeapableParticle(BaseParticle):
     """Particle that can form heaps/piles.
 
@@ -183,55 +263,79 @@ class HeapableParticle(BaseParticle):
                 Defaults to 1.0.
             - heap_limit (list[Point], list[Point-like]): List of x,y vectors that will force this
                 particle to fall if any of them are empty. Defaults to [].
-            - heap_stuck (bool): Whether or not
+            - heap_stuck (bool): Whether or not new particles start out stuck. Defaults to
+                False.
 
     Attributes:
-        TODO
+        heap (HeapArgs): The heap vectors, limits, and probability of the particle. Shared by
+            every particle of the same species.
+        stuck (bool): Whether or not this particle has failed to form a heap, and won't try
+            again until it's moved.
     """
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.heap = HeapArgs()
+    def reset(self):
+        super().reset()
+        self.stuck = self.species.heap.stuck
+
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        super().init_species(species, **kwargs)
+        heap = HeapArgs()
         for key, value in kwargs.items():
             if key == 'heap':
-                self.heap = value.copy()
+                heap = value.copy()
             if key == 'heap_vec':
                 for p in value:
-                    self.heap.vecs.append(Point(p))
+                    heap.vecs.append(Point(p))
             if key == 'heap_prob':
-                self.heap.prob = value
+                heap.prob = value
             if key == 'heap_limit':
                 for p in value:
-                    self.heap.limits.append(Point(p))
+                    heap.limits.append(Point(p))
             if key == 'heap_stuck':
-                self.heap.stuck = value
-        if self.heap.vecs is not None and self.heap.prob >= 1.0:
-            self._depends_on.extend(self.heap.vecs)
-        if self.heap.limits is not None:
-            self._depends_on.extend(self.heap.limits)
+                heap.stuck = value
+        if heap.prob >= 1.0:
+            species.depends_on.extend(heap.vecs)
+        species.depends_on.extend(heap.limits)
+        species.heap = heap
+
+    @property
+    def heap(self):
+        return self.species.heap
 
     def _move(self, sim, dest_pos):
         sim.move_particle(self, dest_pos)
-        self.heap.stuck = False
+        self.stuck = False
         self.updated = True
 
     def update(self, **kwargs):
         if self.updated:
             return
-        sim = kwargs['sim']
+        HeapableParticle._behave(self, kwargs['sim'], kwargs)
+
+    def _behave(self, sim, kwargs):
         limit_triggered = False
         # check if this particle is on top of another particle
-        pos = sim.get_pos(self.rect.topleft)
-        dest_pos = pos + self.gravity.vec
+        x, y = self.pos
+        species = self.species
+        heap = species.heap
+        vec = species.gravity.vec
+        dest_pos = (x + vec.x, y + vec.y)
         if sim.in_bounds(dest_pos) and sim.get_cell(dest_pos) is None:
             return
         # check if this particle is at its heap limit
-        for lim_vec in rand_iter(self.heap.limits):
-            dest_pos = pos + lim_vec
+        rng = sim.rng
+        limits = heap.limits
+        for i in rng.permutation(len(limits)):
+            lim_vec = limits[i]
+            dest_pos = (x + lim_vec.x, y + lim_vec.y)
             if not sim.in_bounds(dest_pos):
                 continue
             if sim.get_cell(dest_pos) is None:
-                dest_pos = pos + lim_vec.get_normalized()
+                # move one step towards the limit (the sign of each component of the vector)
+                dest_pos = (
+                    x + (lim_vec.x > 0) - (lim_vec.x < 0),
+                    y + (lim_vec.y > 0) - (lim_vec.y < 0))
                 if not sim.in_bounds(dest_pos):
                     continue
                 dest_cell = sim.get_cell(dest_pos)
@@ -241,19 +345,207 @@ class HeapableParticle(BaseParticle):
                 limit_triggered = True
                 self._updateable |= dest_cell.active
         # check if the particle is stuck in place
-        if self.heap.stuck or limit_triggered:
+        if self.stuck or limit_triggered:
             return
         # try to form a heap
-        for heap_vec in rand_iter(self.heap.vecs):
-            dest_pos = pos + heap_vec
+        vecs = heap.vecs
+        for i in rng.permutation(len(vecs)):
+            heap_vec = vecs[i]
+            dest_pos = (x + heap_vec.x, y + heap_vec.y)
             if not sim.in_bounds(dest_pos):
                 continue
-            dest_cell = sim.get_cell(dest_pos)
+            dest_cell = sim.resolve_cell(dest_pos, **kwargs)
             if dest_cell is None:
-                if random() >= self.heap.prob:
-                    self.heap.stuck = True
+                if rng.random() >= heap.prob:
+                    self.stuck = True
                     return
                 self._move(sim, dest_pos)
                 return
-            if self.heap.prob >= 1.0:
-                self._updateable |= dest_cell.active
\ No newline at end of file
+            if heap.prob >= 1.0:
+                self._updateable |= dest_cell.active
+
+class LiquidArgs():
+    def __init__(self, rate=1):
+        self.rate = rate
+
+    def copy(self):
+        return LiquidArgs(rate=self.rate)
+
+    def key(self):
+        return (self.rate,)
+
+class LiquidParticle(BaseParticle):
+    """Particle that flows sideways to level out, like a liquid.
+
+    Does not inherit from GravityParticle, but subclasses must inherit from GravityParticle, and
+    should run gravity first so particles only flow once they can't fall.
+
+    Each update, the particle scans along its row in both directions, up to `liquid_rate` cells
+    each way, for the closest empty cell it could fall from, then moves straight there. Ties go
+    to the direction it last flowed in. If there's nowhere to fall within reach, the particle
+    flows to the farthest empty and supported cell it can reach instead, since there may be
+    somewhere to fall further along. It keeps flowing the same way, and only turns back again
+    once the cell it last turned at has emptied, so a pool levels out and then settles instead
+    of sloshing forever. Once it can't flow, the particle deactivates, waiting on the cells it
+    scanned. Higher rates level pools faster, at the cost of longer scans.
+
+    Args:
+        **kwargs: Variable length list of keyword arguments. The following keyword arguments are
+            recognized:\n
+            - liquid (LiquidArgs): LiquidArgs object representing how far this particle flows.
+            - liquid_rate (int): Farthest this particle can flow in a single update, in cells.
+                Defaults to 1.
+
+    Attributes:
+        liquid (LiquidArgs): How far the particle flows in a single update. Shared by every
+            particle of the same species.
+        flow (int): Direction the particle last flowed in, -1 for left, 1 for right, or 0 if it
+            hasn't flowed yet.
+    """
+
+    def reset(self):
+        super().reset()
+        self.flow = 0
+        # cells past the particle's neighbours that the last update looked at
+        self._flow_cells = []
+        # cell that stopped the particle the last time it turned back
+        self._turned_at = None
+
+    @classmethod
+    def init_species(cls, species, **kwargs):
+        super().init_species(species, **kwargs)
+        liquid = LiquidArgs()
+        for key, value in kwargs.items():
+            if key == 'liquid':
+                liquid = value.copy()
+            if key == 'liquid_rate':
+                liquid.rate = value
+        species.liquid = liquid
+        species.depends_on.extend((Point(1, 0), Point(-1, 0)))
+
+    @property
+    def liquid(self):
+        return self.species.liquid
+
+    def update(self, **kwargs):
+        if self.updated:
+            return
+        LiquidParticle._behave(self, kwargs['sim'], kwargs)
+
+    def _wait_cells(self):
+        cells = BaseParticle._wait_cells(self) + self._flow_cells
+        if self._turned_at is not None and self._turned_at[1] == self.pos[1]:
+            # it can turn back again once the cell it turned at empties
+            cells.append(self._turned_at)
+        return cells
+
+    def _behave(self, sim, kwargs):
+        x, y = self.pos
+        species = self.species
+        vec = species.gravity.vec
+        first = self.flow
+        if first == 0:
+            first = 1 if sim.rng.random() < 0.5 else -1
+        reach = species.liquid.rate
+        drop = None
+        # farthest empty and supported cell in each direction
+        flat = {}
+        # the cells that blocked the scan, or could open up a place to fall, are waited on if the
+        # particle deactivates, so it's woken as soon as it could flow again
+        flow_cells = self._flow_cells = []
+        for d in (first, -first):
+            for i in range(1, reach + 1):
+                pos = (x + d * i, y)
+                if not sim.in_bounds(pos):
+                    break
+                # the neighbouring cell can get out of the way first, like with gravity
+                cell = sim.resolve_cell(pos, **kwargs) if i == 1 else sim.get_cell(pos)
+                if cell is not None:
+                    # staying awake for active neighbours would keep whole rows of liquid awake
+                    # on each other's account, so rely on being woken instead
+                    if i > 1:
+                        flow_cells.append(pos)
+                    break
+                below = (pos[0] + vec.x, pos[1] + vec.y)
+                if sim.in_bounds(below):
+                    below_cell = sim.get_cell(below)
+                    if below_cell is None:
+                        drop = (pos, d)
+                        # only look the other way for something closer
+                        reach = i - 1
+                        break
+                    flow_cells.append(below)
+                    # the cell below might still move out of the way, so stay awake until it
+                    # settles
+                    self._updateable |= below_cell.active
+                flat[d] = pos
+        if drop is not None:
+            dest_pos, flow = drop
+            # the row might fill up before the particle falls, and it's yet to be explored
+            self._turned_at = None
+        elif first in flat:
+            # there could be somewhere to fall further along, so keep flowing
+            dest_pos, flow = flat[first], first
+        elif -first in flat and self._can_turn(sim, y):
+            dest_pos, flow = flat[-first], -first
+            self._turned_at = (x + first, y)
+        else:
+            return
+        sim.move_particle(self, dest_pos)
+        self.flow = flow
+        self.updated = True
+
+    def _can_turn(self, sim, y):
+        """Check whether the particle can turn back on a row.
+
+        A particle with nowhere to fall on either side would slosh between the two ends of the
+        row forever, so it only turns back again once the cell it last turned at has emptied,
+        or it's on a different row.
+
+        Args:
+            sim (ParticleSim): The simulation the particle is in.
+            y (int): The row the particle is on.
+
+        Returns:
+            bool: Whether the particle can turn back.
+        """
+        turned = self._turned_at
+        if turned is None or turned[1] != y:
+            return True
+        return sim.in_bounds(turned) and sim.get_cell(turned) is None
+
+def _compile_update(particle_type, behaviours):
+    """Build the `update()` method of a particle class from the properties it lists in
+    `behaviours`.
+
+    Args:
+        particle_type (type): The particle class being defined.
+        behaviours (tuple[type]): The properties to run, in order. Each of them must be a base
+            class of `particle_type` that defines `_behave()`.
+
+    Returns:
+        function: The compiled `update()` method.
+    """
+    steps = []
+    for prop in behaviours:
+        if not issubclass(particle_type, prop) or '_behave' not in prop.__dict__:
+            raise TypeError(f'{particle_type.__name__} can\'t use {prop.__name__} as a '
+                'behaviour, it must be a base class that defines _behave()')
+        steps.append(prop.__dict__['_behave'])
+    steps = tuple(steps)
+    settle = BaseParticle._settle
+
+    def update(self, **kwargs):
+        sim = kwargs['sim']
+        self.updated = False
+        self._updateable = False
+        for step in steps:
+            step(self, sim, kwargs)
+            if self.updated:
+                break
+        settle(self, sim)
+
+    update.__qualname__ = f'{particle_type.__qualname__}.update'
+    update.__doc__ = (f'Run the {", ".join(prop.__name__ for prop in behaviours)} behaviours, '
+        'then deactivate the particle if it couldn\'t update.')
+    return update
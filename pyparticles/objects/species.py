@@ -0,0 +1,82 @@
+from pyparticles.engine.utils import Point
+
+# species that have already been built, keyed by particle class and frozen keyword arguments
+_REGISTRY = {}
+
+# keyword arguments that only affect a single particle, so they're left out of species keys
+INSTANCE_KWARGS = ('rng',)
+_INSTANCE_KWARG_SET = frozenset(INSTANCE_KWARGS)
+
+class Species():
+    """Behaviour parameters shared by every particle of the same kind.
+
+    Species are built once per particle class (and set of keyword arguments) by `get_species()`,
+    then shared by every particle created the same way. Properties store their parameters here
+    instead of on each particle, so particles only hold their own mutable state. Species must not
+    be changed after they're built.
+
+    Attributes:
+        gravity (GravityArgs): Gravity of the species, or None if it doesn't have gravity.
+        heap (HeapArgs): Heap parameters of the species, or None if it doesn't form heaps.
+        liquid (LiquidArgs): Flow parameters of the species, or None if it isn't a liquid.
+        depends_on (tuple[Point]): Offsets of the cells a particle of this species depends on to
+            be activated. If a particle fails to update and all the particles it depends on are
+            deactivated, then the particle will deactivate.
+        kwargs (dict): The keyword arguments the species was built with, leaving out the ones in
+            `INSTANCE_KWARGS`. Creating a particle of the same class with them gives a particle
+            of this species.
+    """
+
+    __slots__ = ('gravity', 'heap', 'liquid', 'depends_on', 'kwargs')
+
+    def __init__(self):
+        self.gravity = None
+        self.heap = None
+        self.liquid = None
+        self.depends_on = []
+        self.kwargs = {}
+
+def _freeze(value):
+    """Convert a keyword argument value into a hashable value that compares equal for equal
+    arguments.
+    """
+    if isinstance(value, Point):
+        return (value.x, value.y)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if hasattr(value, 'key'):
+        return (type(value), value.key())
+    return value
+
+def get_species(particle_type, kwargs):
+    """Get the species shared by every particle of a class created with the same arguments.
+
+    The species is built the first time it's needed by calling the class's `init_species()`
+    method, which the particle properties implement cooperatively.
+
+    Args:
+        particle_type (type): The particle's class.
+        kwargs (dict): The keyword arguments the particle was created with.
+
+    Returns:
+        Species: The shared species.
+    """
+    # most particles are created without any arguments of their own, so skip freezing for them
+    frozen = ()
+    if not kwargs.keys() <= _INSTANCE_KWARG_SET:
+        frozen = tuple((k, _freeze(v)) for k, v in kwargs.items() if k not in INSTANCE_KWARGS)
+    key = (particle_type, frozen)
+    try:
+        species = _REGISTRY.get(key)
+    except TypeError:
+        # an argument can't be hashed, so this particle gets a species of its own
+        key = None
+        species = None
+    if species is None:
+        species = Species()
+        particle_type.init_species(species, **kwargs)
+        species.kwargs = {k: v for k, v in kwargs.items() if k not in INSTANCE_KWARGS}
+        species.depends_on = tuple(species.depends_on)
+        if key is not None:
+            _REGISTRY[key] = species
+    return species
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import unittest
+from pyparticles.engine.regions import Circle
+from pyparticles.objects import particles
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, 'ArraySim needs numpy')
+class ArraySimWorkersTest(unittest.TestCase):
+
+    def _run(self, workers):
+        from pyparticles.engine.arraysim import ArraySim
+        with ArraySim((96, 80), (1, 1), seed=7, workers=workers, stripe_height=8,
+            headless=True) as sim:
+            sim.add_particles((10, 0, 70, 30), particles.TestParticle)
+            sim.add_particles(Circle((48, 60), 8), particles.TestParticle)
+            for _ in range(25):
+                sim.step()
+            return [(sim.get_cell((x, y)), sim.is_active((x, y)), sim.is_stuck((x, y)))
+                for y in range(80) for x in range(96)]
+
+    def test_workers_match_serial(self):
+        self.assertEqual(self._run(2), self._run(0))
+
+    def test_headless_without_pygame(self):
+        # a None entry in sys.modules makes importing pygame fail, in the workers as well
+        script = (
+            'import sys\n'
+            'sys.modules["pygame"] = None\n'
+            'from pyparticles.engine.arraysim import ArraySim\n'
+            'from pyparticles.objects import particles\n'
+            'with ArraySim((32, 32), (1, 1), seed=7, workers=2, headless=True) as sim:\n'
+            '    sim.add_particles((0, 0, 32, 8), particles.TestParticle)\n'
+            '    sim.step()\n'
+            '    sim.draw()\n'
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', script], cwd=root, check=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles
+
+class ChainTest(unittest.TestCase):
+
+    def test_column_falls_in_one_step(self):
+        sim = ParticleSim((3, 20), (1, 1), seed=1, render=None)
+        sim.add_particles((1, 0, 1, 10), particles.TestParticle)
+        # particles only start updating the step after they're added
+        sim.step()
+        self.assertEqual(sim.step(), 10)
+        self.assertIsNone(sim.get_cell((1, 0)))
+        for y in range(1, 11):
+            self.assertIsNotNone(sim.get_cell((1, y)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import io
+import unittest
+from pyparticles.engine.changes import ChangeReader, ChangeWriter
+from pyparticles.engine.regions import Circle
+from pyparticles.engine.snapshot import species_record
+from pyparticles.objects import particles
+from tests.worlds import HEIGHT, WIDTH, make_world
+
+class ChangeStreamTest(unittest.TestCase):
+
+    def test_replay(self):
+        sim = make_world()
+        stream = io.BytesIO()
+        writer = ChangeWriter(stream, (WIDTH, HEIGHT))
+        for i, delta in enumerate(sim.iter_changes(40)):
+            writer.write(delta)
+            if i == 10:
+                sim.remove_particles(Circle((10, 40), 4))
+                sim.add_particles(Circle((50, 5), 3), particles.TestLiquidParticle)
+                # same class as the rest, but a species of its own
+                sim.add_particles((30, 2, 4, 2),
+                    lambda: particles.TestParticle(gravity_vec=(0, -1), rng=sim.rng))
+            if i == 11:
+                # added and removed again between deltas, so never seen by the reader
+                sim.add_particles((5, 0, 3, 3), particles.TestParticle)
+                sim.remove_particles((5, 0, 3, 3))
+        stream.seek(0)
+        reader = ChangeReader(stream)
+        for _ in reader:
+            pass
+        live = []
+        for y in range(HEIGHT):
+            for x in range(WIDTH):
+                p = sim.get_cell((x, y))
+                live.append(None if p is None else species_record(type(p), p.species.kwargs))
+        replayed = [reader.species[n - 1] if n else None for n in reader.cells]
+        self.assertEqual(replayed, live)
+        self.assertEqual(len(reader.species), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from pyparticles.engine.regions import Circle
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles, properties
+
+class _SteppedParticle(particles.TestParticle):
+    """TestParticle that runs each property's own `update()` instead of the compiled one."""
+
+    def update(self, **kwargs):
+        self.pre_update()
+        properties.GravityParticle.update(self, **kwargs)
+        properties.HeapableParticle.update(self, **kwargs)
+        properties.BaseParticle.update(self, **kwargs)
+
+class _SteppedLiquidParticle(particles.TestLiquidParticle):
+    """TestLiquidParticle that runs each property's own `update()` instead of the compiled one."""
+
+    def update(self, **kwargs):
+        self.pre_update()
+        properties.GravityParticle.update(self, **kwargs)
+        properties.LiquidParticle.update(self, **kwargs)
+        properties.BaseParticle.update(self, **kwargs)
+
+def _run(solid, liquid):
+    """Fill, edit, and step a world, then get the state of every cell and the next random draw.
+    """
+    sim = ParticleSim((48, 40), (1, 1), seed=5, render=None)
+    sim.add_particles((0, 30, 48, 10), solid)
+    sim.add_particles(Circle((16, 10), 5), liquid)
+    sim.add_particles(Circle((34, 12), 5), solid)
+    for i in range(60):
+        sim.step()
+        if i == 20:
+            sim.remove_particles((20, 30, 6, 6))
+    cells = []
+    for y in range(40):
+        for x in range(48):
+            p = sim.get_cell((x, y))
+            if p is None:
+                cells.append(None)
+            else:
+                cells.append((isinstance(p, liquid), p.variant, p.active,
+                    getattr(p, 'stuck', False), sim.get_waiting_on(p)))
+    return cells, sim.rng.random()
+
+class CompiledUpdateTest(unittest.TestCase):
+
+    def test_compiled_matches_properties(self):
+        self.assertIsNot(particles.TestParticle.update, _SteppedParticle.update)
+        compiled = _run(particles.TestParticle, particles.TestLiquidParticle)
+        stepped = _run(_SteppedParticle, _SteppedLiquidParticle)
+        self.assertEqual(compiled, stepped)
+
+    def test_behaviours_must_be_bases(self):
+        with self.assertRaises(TypeError):
+            class _Broken(properties.GravityParticle, properties.BaseParticle):
+                behaviours = (properties.GravityParticle, properties.HeapableParticle)
+
+if __name__ == '__main__':
+    unittest.main()
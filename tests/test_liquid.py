@@ -0,0 +1,35 @@
+import unittest
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles
+
+class LiquidTest(unittest.TestCase):
+
+    def _pour(self, width, height, region, seed):
+        """Pour liquid into an empty box and step until it settles.
+
+        Returns:
+            list[int]: The number of particles in each column.
+        """
+        sim = ParticleSim((width, height), (1, 1), seed=seed, render=None)
+        sim.add_particles(region, particles.TestLiquidParticle)
+        # particles only start updating the step after they're added
+        sim.step()
+        for _ in range(2000):
+            if not sim.step():
+                break
+        else:
+            self.fail('the liquid never settled')
+        return [sim.count_particles((x, 0, 1, height)) for x in range(width)]
+
+    def test_column_levels_out(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                heights = self._pour(60, 40, (28, 0, 4, 30), seed)
+                self.assertLessEqual(max(heights) - min(heights), 1)
+
+    def test_dam_levels_out(self):
+        heights = self._pour(120, 60, (0, 10, 20, 50), 1)
+        self.assertLessEqual(max(heights) - min(heights), 1)
+
+if __name__ == '__main__':
+    unittest.main()
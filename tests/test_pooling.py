@@ -0,0 +1,50 @@
+import unittest
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles
+
+class PoolTest(unittest.TestCase):
+
+    def _settle(self, sim, p, pos):
+        sim.add_particle(p, pos)
+        for _ in range(15):
+            sim.step()
+        self.assertFalse(p.active)
+
+    def test_pooled_particle_comes_back_reset(self):
+        sim = ParticleSim((8, 8), (1, 1), seed=1, render=None)
+        sim.add_particles((0, 7, 8, 1), particles.TestParticle)
+        p = particles.TestParticle(rng=sim.rng)
+        self._settle(sim, p, (3, 0))
+        sim.remove_particle(p.pos)
+        reused = sim.new_particle(particles.TestParticle)
+        self.assertIs(reused, p)
+        self.assertTrue(p.active)
+        self.assertTrue(p.updated)
+        self.assertIsNone(p.pos)
+        self.assertIsNone(p.sim)
+        self.assertIsNone(p.chunk)
+        self.assertEqual(sim.get_waiting_on(p), ())
+        sim.add_particle(p, (5, 0))
+        self.assertIs(sim.get_cell((5, 0)), p)
+
+    def test_pooled_liquid_forgets_its_flow(self):
+        sim = ParticleSim((8, 8), (1, 1), seed=1, render=None)
+        sim.add_particles((0, 7, 8, 1), particles.TestParticle)
+        p = particles.TestLiquidParticle(rng=sim.rng)
+        self._settle(sim, p, (3, 0))
+        self.assertNotEqual(p.flow, 0)
+        sim.remove_particle(p.pos)
+        self.assertIs(sim.new_particle(particles.TestLiquidParticle), p)
+        self.assertEqual(p.flow, 0)
+        self.assertIsNone(p._turned_at)
+
+    def test_pool_is_per_species(self):
+        sim = ParticleSim((8, 8), (1, 1), seed=1, render=None)
+        p = particles.TestParticle(gravity_vec=(0, -1), rng=sim.rng)
+        sim.add_particle(p, (3, 3))
+        sim.remove_particle((3, 3))
+        self.assertIsNot(sim.new_particle(particles.TestParticle), p)
+        self.assertIs(sim.new_particle(particles.TestParticle, gravity_vec=(0, -1)), p)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import random
+import unittest
+from tests.worlds import HEIGHT, WIDTH, make_world
+
+class SpatialQueryTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        for sparse in (False, True):
+            sim = make_world(sparse)
+            for _ in range(200):
+                area = (rng.randrange(-8, WIDTH), rng.randrange(-8, HEIGHT),
+                    rng.randrange(0, 40), rng.randrange(0, 40))
+                left, top, w, h = area
+                counts = {}
+                for y in range(max(0, top), min(HEIGHT, top + h)):
+                    for x in range(max(0, left), min(WIDTH, left + w)):
+                        p = sim.get_cell((x, y))
+                        if p is not None:
+                            counts[type(p)] = counts.get(type(p), 0) + 1
+                with self.subTest(sparse=sparse, area=area):
+                    self.assertEqual(sim.count_particles(area), sum(counts.values()))
+                    self.assertEqual(sim.is_area_empty(area), not counts)
+                    self.assertEqual(sim.get_species_counts(area), counts)
+
+    def test_find_empty_cell(self):
+        rng = random.Random(2)
+        for sparse in (False, True):
+            sim = make_world(sparse)
+            empty = [(x, y) for y in range(HEIGHT) for x in range(WIDTH)
+                if sim.get_cell((x, y)) is None]
+            for _ in range(100):
+                px, py = rng.randrange(WIDTH), rng.randrange(HEIGHT)
+                max_distance = rng.choice([None, 2, 6.5])
+                distances = [(x - px)**2 + (y - py)**2 for x, y in empty]
+                if max_distance is not None:
+                    distances = [d for d in distances if d <= max_distance**2]
+                found = sim.find_empty_cell((px, py), max_distance)
+                with self.subTest(sparse=sparse, pos=(px, py), max_distance=max_distance):
+                    if not distances:
+                        self.assertIsNone(found)
+                    else:
+                        self.assertIsNone(sim.get_cell(found))
+                        self.assertEqual((found[0] - px)**2 + (found[1] - py)**2, min(distances))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from tests.worlds import HEIGHT, WIDTH, grid_state, make_world
+
+def _state(seed):
+    """Get the grid state and sprite variants of a world built with a seed."""
+    sim = make_world(seed=seed)
+    variants = [getattr(sim.get_cell((x, y)), 'variant', None)
+        for y in range(HEIGHT) for x in range(WIDTH)]
+    return grid_state(sim), variants
+
+class SeedTest(unittest.TestCase):
+
+    def test_same_seed_same_state(self):
+        self.assertEqual(_state(3), _state(3))
+
+    def test_different_seed_diverges(self):
+        cells, variants = _state(3)
+        other_cells, other_variants = _state(4)
+        self.assertNotEqual(cells, other_cells)
+        self.assertNotEqual(variants, other_variants)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles, properties
+from tests.worlds import grid_state, make_world
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.ppsm')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        for sparse in (False, True):
+            with self.subTest(sparse=sparse):
+                sim = make_world(sparse)
+                sim.save(self.path)
+                loaded = ParticleSim.load(self.path, (1, 1), render=None, sparse=sparse)
+                self.assertEqual(grid_state(loaded), grid_state(sim))
+                self.assertEqual(len(loaded._active_particles), len(sim._active_particles))
+
+    def test_species_arguments(self):
+        sim = ParticleSim((8, 8), (1, 1), seed=1, render=None)
+        sim.add_particle(particles.TestParticle(rng=sim.rng), (2, 4))
+        sim.add_particle(particles.TestParticle(gravity_vec=(0, -1),
+            liquid=properties.LiquidArgs(rate=3), rng=sim.rng), (5, 4))
+        sim.save(self.path)
+        loaded = ParticleSim.load(self.path, (1, 1), render=None)
+        self.assertEqual(grid_state(loaded, 8, 8), grid_state(sim, 8, 8))
+        falling = loaded.get_cell((2, 4))
+        rising = loaded.get_cell((5, 4))
+        self.assertIs(falling.species, particles.TestParticle.species_for())
+        self.assertEqual(rising.gravity.vec, (0, -1))
+        self.assertEqual(rising.species.kwargs['liquid'].rate, 3)
+        loaded.step()
+        self.assertEqual(falling.pos, (2, 5))
+        self.assertEqual(rising.pos, (5, 3))
+
+    def test_sparse_matches_dense(self):
+        make_world(sparse=False).save(self.path)
+        with open(self.path, 'rb') as f:
+            dense = f.read()
+        make_world(sparse=True).save(self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), dense)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles
+
+def _floor_world():
+    """Build a 5x6 world with a full bottom row to settle particles on."""
+    sim = ParticleSim((5, 6), (1, 1), seed=1, render=None)
+    sim.add_particles((0, 5, 5, 1), particles.TestParticle)
+    for _ in range(3):
+        sim.step()
+    return sim
+
+class WaitGraphTest(unittest.TestCase):
+
+    def test_registration_is_idempotent(self):
+        sim = _floor_world()
+        p = particles.TestParticle(rng=sim.rng)
+        sim.add_particle(p, (2, 4))
+        sim.wait_on(p, [(2, 5), (1, 5)])
+        sim.wait_on(p, [(2, 5), (2, 5), (1, 5)])
+        self.assertEqual(sim.get_waiting_on(p), ((2, 5), (1, 5)))
+        self.assertEqual(sim.get_waiters((2, 5)).count(p), 1)
+        self.assertEqual(sim.get_waiters((1, 5)).count(p), 1)
+
+    def test_remove_cell_listed_twice(self):
+        # the first heap vector is the same cell as the gravity vector
+        sim = _floor_world()
+        p = particles.TestParticle(heap_prob=1.0, heap_vec=[(0, 1), (1, 1), (-1, 1)],
+            rng=sim.rng)
+        sim.add_particle(p, (2, 4))
+        for _ in range(5):
+            sim.step()
+        self.assertFalse(p.active)
+        self.assertEqual(len(set(sim.get_waiting_on(p))), len(sim.get_waiting_on(p)))
+        sim.remove_particle((2, 5))
+        self.assertTrue(p.active)
+        self.assertEqual(sim.get_waiting_on(p), ())
+        self.assertEqual(sim.get_waiters((1, 5)), [])
+
+    def test_removal_wakes_waiters(self):
+        sim = _floor_world()
+        p = particles.TestParticle(rng=sim.rng)
+        sim.add_particle(p, (2, 4))
+        for _ in range(5):
+            sim.step()
+        self.assertFalse(p.active)
+        sim.remove_particles((0, 5, 5, 1))
+        self.assertTrue(p.active)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Small headless worlds shared by the tests."""
+from pyparticles.engine.regions import Circle
+from pyparticles.engine.simulation import ParticleSim
+from pyparticles.objects import particles
+
+# grid size of the worlds built by `make_world()`
+WIDTH = 64
+HEIGHT = 48
+
+def make_world(sparse=False, seed=3):
+    """Build a small headless world with both particle classes, part way through settling.
+
+    Args:
+        sparse (bool): Whether or not the simulation is sparse. Defaults to False.
+        seed (int): Seed of the simulation. Defaults to 3.
+
+    Returns:
+        ParticleSim: The simulation.
+    """
+    sim = ParticleSim((WIDTH, HEIGHT), (1, 1), seed=seed, render=None, sparse=sparse)
+    sim.add_particles((0, 36, WIDTH, 12), particles.TestParticle)
+    sim.add_particles(Circle((20, 10), 6), particles.TestLiquidParticle)
+    sim.add_particles(Circle((45, 12), 5), particles.TestParticle)
+    for _ in range(20):
+        sim.step()
+    sim.remove_particles((28, 38, 6, 6))
+    for _ in range(5):
+        sim.step()
+    return sim
+
+def grid_state(sim, width=WIDTH, height=HEIGHT):
+    """Get the class, state, and waits of the particle in every cell, row by row.
+
+    Returns:
+        list[tuple]: None for empty cells, otherwise the particle's class, active and stuck
+            state, and the cells it's waiting on.
+    """
+    cells = []
+    for y in range(height):
+        for x in range(width):
+            p = sim.get_cell((x, y))
+            if p is None:
+                cells.append(None)
+            else:
+                cells.append((type(p), p.active, getattr(p, 'stuck', False),
+                    sim.get_waiting_on(p)))
+    return cells